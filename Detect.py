@@ -1,4 +1,11 @@
 import sys
+
+if __name__ == "__main__" and "--headless" in sys.argv[1:]:
+    # Batch mode has to run on servers without a display, hand off before PyQt6 is imported
+    import runpy
+    runpy.run_module("detect_headless", run_name="__main__", alter_sys=True)
+    sys.exit(0)
+
 import cv2
 import os
 from PyQt6.QtWidgets import (
@@ -6,16 +13,26 @@ from PyQt6.QtWidgets import (
     QVBoxLayout, QFileDialog, QHBoxLayout, QComboBox,
     QFrame, QGroupBox, QMessageBox, QSlider, QDoubleSpinBox,
     QLineEdit, QTabWidget, QRadioButton, QButtonGroup, QSplitter,
-    QTimeEdit, QProgressBar
+    QTimeEdit, QProgressBar, QSpinBox
 )
 from PyQt6.QtGui import QImage, QPixmap
-from PyQt6.QtCore import QTimer, Qt, pyqtSignal, QTime
-from ultralytics import YOLO
+from PyQt6.QtCore import QTimer, Qt, pyqtSignal, QTime, QThread
 import requests
 from pathlib import Path
 import numpy as np
 import torch
+import threading
+import time
+from collections import deque
 from datetime import datetime
+from detection_core import (
+    TRACKERS, BACKENDS, MaskRenderer, BoxPropagator, StrideController, MotionGate,
+    merge_region_results, file_hash, load_model, measure_latency, run_inference, draw_results
+)
+from perf_stats import PerfRecorder
+from frame_source import open_source
+from frame_extract import ParallelExtraction, sample_frames
+from image_writer import IMAGE_FORMATS
 
 
 class ClickableProgressBar(QProgressBar):
@@ -36,6 +53,7 @@ class ClickableProgressBar(QProgressBar):
 
 class ResizableVideoLabel(QLabel):
     doubleClicked = pyqtSignal()
+    displaySizeChanged = pyqtSignal(int, int)
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -43,15 +61,13 @@ class ResizableVideoLabel(QLabel):
         self.setStyleSheet("color: white; font-size: 16px;")
         self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
         self._pixmap = None  # Store the pixmap separately
+        self.fast_scaling = False
 
     def resizeEvent(self, event):
         if self._pixmap is not None:
-            self.setPixmap(self._pixmap.scaled(
-                self.width(), self.height(),
-                Qt.AspectRatioMode.KeepAspectRatio,
-                Qt.TransformationMode.SmoothTransformation
-            ))
+            super().setPixmap(self.fit_pixmap(self._pixmap))
         super().resizeEvent(event)
+        self.displaySizeChanged.emit(self.width(), self.height())
 
     def mouseDoubleClickEvent(self, event):
         self.doubleClicked.emit()
@@ -60,11 +76,452 @@ class ResizableVideoLabel(QLabel):
     def setPixmap(self, pixmap):
         """Override setPixmap to store the original pixmap"""
         self._pixmap = pixmap
-        super().setPixmap(pixmap.scaled(
-            self.width(), self.height(),
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation
-        ))
+        super().setPixmap(self.fit_pixmap(pixmap))
+
+    def fit_pixmap(self, pixmap):
+        """Scale the pixmap to the label, skipped when it was already scaled to fit"""
+        if pixmap.size().scaled(self.size(), Qt.AspectRatioMode.KeepAspectRatio) == pixmap.size():
+            return pixmap
+        mode = (Qt.TransformationMode.FastTransformation if self.fast_scaling
+                else Qt.TransformationMode.SmoothTransformation)
+        return pixmap.scaled(self.width(), self.height(), Qt.AspectRatioMode.KeepAspectRatio, mode)
+
+
+def fit_size(width, height, target_width, target_height):
+    """Size of a width x height image fitted inside the target, keeping its aspect ratio.
+
+    Same integer rounding as QSize.scaled(), so the label sees the result as already fitted.
+    """
+    fitted_width = target_height * width // height
+    if fitted_width <= target_width:
+        return max(1, fitted_width), target_height
+    return target_width, max(1, target_width * height // width)
+
+
+class DisplayConverter:
+    """Turns BGR frames into QImages sized for the video label.
+
+    Qt reads the BGR buffer directly (Format_BGR888) so no colour conversion is
+    needed, frames are scaled to the label size once with OpenCV, and the resize
+    buffers are reused between frames. The arrays behind the last images are kept
+    alive here until the GUI has turned them into pixmaps.
+    """
+
+    def __init__(self, buffer_count=2):
+        self.target_size = None  # (width, height) of the video label
+        self.fast = False
+        self._buffers = [None] * buffer_count
+        self._next_buffer = 0
+        self._keep_alive = deque(maxlen=buffer_count)
+
+    def set_target_size(self, width, height):
+        self.target_size = (width, height) if width > 0 and height > 0 else None
+
+    def _buffer(self, shape, dtype):
+        index = self._next_buffer
+        self._next_buffer = (index + 1) % len(self._buffers)
+        buffer = self._buffers[index]
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers[index] = buffer
+        return buffer
+
+    def convert(self, frame):
+        """Return a QImage of the frame that shares memory with a buffer held by the converter"""
+        h, w = frame.shape[:2]
+        if self.target_size is not None:
+            fit_w, fit_h = fit_size(w, h, *self.target_size)
+            if (fit_w, fit_h) != (w, h):
+                interpolation = cv2.INTER_NEAREST if self.fast else (
+                    cv2.INTER_AREA if fit_w < w else cv2.INTER_LINEAR)
+                scaled = self._buffer((fit_h, fit_w, 3), frame.dtype)
+                cv2.resize(frame, (fit_w, fit_h), dst=scaled, interpolation=interpolation)
+                frame = scaled
+                h, w = fit_h, fit_w
+        if not frame.flags['C_CONTIGUOUS']:
+            frame = np.ascontiguousarray(frame)
+        self._keep_alive.append(frame)
+        return QImage(frame.data, w, h, frame.strides[0], QImage.Format.Format_BGR888)
+
+
+class FrameQueue:
+    """Bounded queue between pipeline stages.
+
+    When full, put() either discards the oldest item (live sources, display)
+    or blocks the producer until there is room (files, where every frame counts).
+    """
+
+    def __init__(self, maxsize=2, drop_oldest=True):
+        self.maxsize = maxsize
+        self.drop_oldest = drop_oldest
+        self.dropped = 0
+        self._items = deque()
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        """Add an item, returns False if the queue was closed"""
+        with self._cond:
+            while len(self._items) >= self.maxsize and not self.drop_oldest and not self._closed:
+                self._cond.wait(0.1)
+            if self._closed:
+                return False
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=0.1):
+        """Return the next item, or None if nothing arrived within the timeout"""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        """Mark the end of the stream; queued items can still be drained"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def is_drained(self):
+        with self._cond:
+            return self._closed and not self._items
+
+
+class CaptureWorker(QThread):
+    """Pipeline stage 1: decodes frames from the capture into a queue.
+
+    For live streams the queue has a single drop-oldest slot, so this thread acts
+    as a latest-frame grabber: it keeps draining the stream at the camera's rate
+    and inference always picks up the newest decoded frame, however slow the model is.
+    Every frame is stamped with its capture time so the display can report its age.
+    A live source that stops delivering frames is reconnected here, off the GUI thread.
+    """
+    source_ended = pyqtSignal()
+    reconnect_attempts = 5
+    reconnect_delay_ms = 1000
+
+    def __init__(self, cap, out_queue, perf=None, parent=None):
+        super().__init__(parent)
+        self.cap = cap
+        self.out_queue = out_queue
+        self.perf = perf
+
+    def run(self):
+        frame_index = 0
+        while not self.isInterruptionRequested():
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            if self.perf is not None:
+                self.perf.record("decode", start, time.perf_counter() - start, "capture")
+            if not ret:
+                if self.reconnect():
+                    continue
+                self.source_ended.emit()
+                break
+            if not self.out_queue.put((frame_index, frame, time.monotonic())):
+                break
+            frame_index += 1
+        self.out_queue.close()
+
+    def reconnect(self):
+        """Reopen a live source that stopped delivering frames, returns whether it is back"""
+        if not self.cap.live:
+            return False
+        for attempt in range(1, self.reconnect_attempts + 1):
+            # Sleep in short steps so stopping the pipeline doesn't wait out the delay
+            for _ in range(self.reconnect_delay_ms // 100):
+                if self.isInterruptionRequested():
+                    return False
+                self.msleep(100)
+            print(f"Frame source lost, reconnecting ({attempt}/{self.reconnect_attempts})...")
+            if self.cap.reconnect():
+                return True
+        return False
+
+
+class InferenceWorker(QThread):
+    """Pipeline stage 2: runs the model on queued frames.
+
+    Frames can be batched into a single predict call. Alternatively a motion gate
+    skips the model on static frames and/or a stride controller runs it only on
+    keyframes, propagating boxes in between.
+    """
+    error_occurred = pyqtSignal(str)
+    batch_size_selected = pyqtSignal(int)
+    stride_changed = pyqtSignal(int)
+    gate_stats = pyqtSignal(int, int)  # Skipped frames, total frames
+
+    auto_batch_candidates = [1, 2, 4, 8, 16]
+
+    def __init__(self, model, settings_provider, in_queue, out_queue, batch_size=1, stride_controller=None,
+                 motion_gate=None, perf=None, parent=None):
+        super().__init__(parent)
+        self.model = model
+        self.settings_provider = settings_provider
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.batch_size = batch_size  # Frames per predict call, or "auto"
+        self.stride_controller = stride_controller
+        self.motion_gate = motion_gate
+        self.perf = perf
+
+    def record_predict(self, start, elapsed, results, frame_count):
+        """Record a predict call, split into the preprocess/inference/postprocess times YOLO reports"""
+        if self.perf is None:
+            return
+        self.perf.record("predict", start, elapsed, "inference")
+        if not results:
+            return
+        # speed holds per-image milliseconds, lay the three phases out one after the other
+        speed = getattr(results[0], "speed", None) or {}
+        offset = start
+        for phase in ("preprocess", "inference", "postprocess"):
+            value = speed.get(phase)
+            if isinstance(value, (int, float)):
+                duration = value * frame_count / 1000
+                self.perf.record(phase, offset, duration, "inference")
+                offset += duration
+
+    def next_batch(self, size):
+        """Collect up to size frames, fewer at the end of the stream"""
+        batch = []
+        while len(batch) < size and not self.isInterruptionRequested():
+            item = self.in_queue.get()
+            if item is None:
+                if self.in_queue.is_drained():
+                    break
+                continue
+            batch.append(item)
+        return batch
+
+    def process_batch(self, batch):
+        """Run one predict call over the batch and forward the results frame by frame.
+
+        Returns (ok, seconds spent in predict, results per frame); ok is False once the
+        output queue is closed.
+        """
+        settings = self.settings_provider()
+        frames = [frame for _, frame, _ in batch]
+        start = time.perf_counter()
+        try:
+            results = run_inference(self.model, frames if len(frames) > 1 else frames[0], settings)
+            # predict returns one Results object per input frame, in input order
+            per_frame_results = [[r] for r in results]
+        except Exception as e:
+            print(f"Inference error: {str(e)}")
+            self.error_occurred.emit(f"{settings['task_type'].capitalize()} error - {str(e)}")
+            per_frame_results = [[] for _ in batch]
+        elapsed = time.perf_counter() - start
+        self.record_predict(start, elapsed, [r[0] for r in per_frame_results if r], len(batch))
+
+        for (frame_index, frame, captured_at), frame_results in zip(batch, per_frame_results):
+            if not self.out_queue.put((frame_index, frame, frame_results, settings, captured_at)):
+                return False, elapsed, per_frame_results
+        return True, elapsed, per_frame_results
+
+    def tune_batch_size(self):
+        """Try increasing batch sizes on the incoming frames and return the fastest one.
+
+        Every frame used for the measurement is processed normally, so nothing is wasted.
+        Returns None if the stream ended or the pipeline stopped while tuning.
+        """
+        # The first call includes model warm-up, keep it out of the measurements
+        batch = self.next_batch(1)
+        if not batch or not self.process_batch(batch)[0]:
+            return None
+
+        best_size, best_fps = 1, 0.0
+        for size in self.auto_batch_candidates:
+            batch = self.next_batch(size)
+            if not batch:
+                return None
+            ok, elapsed, _ = self.process_batch(batch)
+            if not ok:
+                return None
+            if len(batch) < size:
+                break
+            fps = len(batch) / max(elapsed, 1e-6)
+            if fps > best_fps:
+                best_size, best_fps = size, fps
+            elif fps < best_fps * 0.95:
+                break  # Larger batches only get slower from here
+        return best_size
+
+    def infer_frame(self, frame, settings, region=None, last_results=None):
+        """Run the model on one frame, or only on its changed region, returns (results, seconds)"""
+        start = time.perf_counter()
+        try:
+            if region is not None:
+                x1, y1, x2, y2 = region
+                region_results = run_inference(self.model, frame[y1:y2, x1:x2], settings)
+                results = merge_region_results(frame, last_results, region_results, region)
+                raw_results = region_results
+            else:
+                results = run_inference(self.model, frame, settings)
+                raw_results = results
+        except Exception as e:
+            print(f"Inference error: {str(e)}")
+            self.error_occurred.emit(f"{settings['task_type'].capitalize()} error - {str(e)}")
+            results = raw_results = []
+        elapsed = time.perf_counter() - start
+        self.record_predict(start, elapsed, raw_results, 1)
+        return results, elapsed
+
+    def run_frame_by_frame(self):
+        """Per-frame loop for the motion gate and adaptive stride modes.
+
+        The motion gate reuses the last detections while the scene is static, the
+        stride controller runs the model on keyframes and propagates boxes in between.
+        """
+        controller = self.stride_controller
+        gate = self.motion_gate
+        propagator = BoxPropagator() if controller is not None else None
+        last_results = None
+        frames_since_keyframe = None
+        while not self.isInterruptionRequested():
+            batch = self.next_batch(1)
+            if not batch:
+                break
+            frame_index, frame, captured_at = batch[0]
+            settings = self.settings_provider()
+            # Take the comparison images now, the render stage draws on the frame once it is queued
+            gray = propagator.to_gray(frame) if propagator is not None else None
+            small = gate.small_gray(frame) if gate is not None else None
+
+            region = None
+            if gate is not None:
+                gate.sensitivity = settings["motion_sensitivity"]
+                changed, region = gate.check(small)
+                if gate.total % 10 == 0:
+                    self.gate_stats.emit(gate.skipped, gate.total)
+                if not changed and last_results is not None:
+                    # Static scene, keep showing the last detections
+                    if not self.out_queue.put((frame_index, frame, last_results, settings, captured_at)):
+                        break
+                    continue
+
+            # Masks can't be moved with boxes, segmentation always runs the model
+            keyframe = (controller is None or frames_since_keyframe is None
+                        or frames_since_keyframe >= controller.stride or settings["task_type"] != "detection")
+            previous_stride = controller.stride if controller is not None else None
+            if keyframe:
+                # Re-detect only the changed region when it is small compared to the frame
+                use_region = (region is not None and settings["motion_regions"] and last_results is not None
+                              and settings["task_type"] == "detection"
+                              and (region[2] - region[0]) * (region[3] - region[1])
+                              < 0.5 * frame.shape[0] * frame.shape[1])
+                results, elapsed = self.infer_frame(frame, settings, region if use_region else None, last_results)
+                if gate is not None:
+                    gate.accept(small)
+                if controller is not None:
+                    propagator.reset(gray, results)
+                    controller.add_inference(elapsed)
+                frames_since_keyframe = 1
+            else:
+                start = time.perf_counter()
+                results, motion = propagator.propagate(gray)
+                elapsed = time.perf_counter() - start
+                controller.add_propagation(elapsed, motion)
+                if self.perf is not None:
+                    self.perf.record("propagate", start, elapsed, "inference")
+                frames_since_keyframe += 1
+
+            last_results = results
+            if controller is not None and controller.stride != previous_stride:
+                self.stride_changed.emit(controller.stride)
+            if not self.out_queue.put((frame_index, frame, results, settings, captured_at)):
+                break
+
+    def run(self):
+        if self.stride_controller is not None or self.motion_gate is not None:
+            self.run_frame_by_frame()
+            self.out_queue.close()
+            return
+
+        batch_size = self.batch_size
+        if batch_size == "auto":
+            batch_size = self.tune_batch_size()
+            if batch_size is not None:
+                self.batch_size_selected.emit(batch_size)
+
+        while batch_size is not None and not self.isInterruptionRequested():
+            batch = self.next_batch(batch_size)
+            if not batch:
+                break
+            if not self.process_batch(batch)[0]:
+                break
+        self.out_queue.close()
+
+
+class RenderWorker(QThread):
+    """Pipeline stage 3: draws results and prepares the image for display"""
+    frame_ready = pyqtSignal(QImage, float)  # Image and the time its frame was captured
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, names, in_queue, perf=None, parent=None):
+        super().__init__(parent)
+        self.names = names
+        self.in_queue = in_queue
+        self.perf = perf
+        self.show_overlay = False  # Draw the live stage timings onto the frame
+        self.skipped_display = 0
+        self.mask_renderer = MaskRenderer()
+        self.converter = DisplayConverter()
+        self._display_busy = threading.Event()
+
+    def frame_displayed(self):
+        """Called by the GUI once it has shown the last emitted frame"""
+        self._display_busy.clear()
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            item = self.in_queue.get()
+            if item is None:
+                if self.in_queue.is_drained():
+                    break
+                continue
+
+            frame_index, frame, results, settings, captured_at = item
+            start = time.perf_counter()
+            try:
+                draw_results(frame, results, self.names, settings["task_type"], self.mask_renderer)
+            except Exception as e:
+                print(f"Render error: {str(e)}")
+                self.error_occurred.emit(f"Render error - {str(e)}")
+            if self.perf is not None:
+                self.perf.record("draw", start, time.perf_counter() - start, "render")
+                self.perf.frame_done()
+
+            # Don't pile up frames in the GUI event queue if it can't keep up
+            if self._display_busy.is_set():
+                self.skipped_display += 1
+                continue
+            self._display_busy.set()
+            if self.show_overlay and self.perf is not None:
+                self.draw_overlay(frame)
+            start = time.perf_counter()
+            qt_image = self.converter.convert(frame)
+            if self.perf is not None:
+                self.perf.record("convert", start, time.perf_counter() - start, "render")
+            self.frame_ready.emit(qt_image, captured_at)
+
+    def draw_overlay(self, frame):
+        """Draw the performance stats in the top-left corner of the frame"""
+        lines = self.perf.format_lines()
+        scale = max(0.4, frame.shape[0] / 1200)
+        line_height = int(44 * scale)
+        for i, line in enumerate(lines):
+            y = (i + 1) * line_height
+            cv2.putText(frame, line, (10, y), cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), 3, cv2.LINE_AA)
+            cv2.putText(frame, line, (10, y), cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 255, 0), 1, cv2.LINE_AA)
 
 
 class YOLOVideoApp(QWidget):
@@ -96,22 +553,38 @@ class YOLOVideoApp(QWidget):
         
         # Volume control (for future audio implementation)
         self.volume_level = 100
+
+        # Display scaling
+        self.fast_scaling = False
+        self.display_converter = DisplayConverter()
         
         # Detection parameters
         self.confidence = 0.5
         self.persist = False
         self.tracker_type = "bytetrack.yaml"
+        self.batch_size = 1  # Frames per predict call for video files, or "auto"
+        self.batch_size_options = ["1", "2", "4", "8", "16", "Auto"]
+        self.adaptive_stride = False  # Run the model on keyframes only, propagate boxes in between
+        self.target_fps = 15.0
+        self.motion_gate_enabled = False  # Skip the model while the scene is static
+        self.motion_sensitivity = 0.5
+        self.motion_regions = False  # Only re-detect the changed region
+
+        # Performance stats, kept after a run so it can still be exported
+        self.perf_recorder = None
+        self.perf_overlay = False
         
         # Available trackers
-        self.trackers = {
-            "ByteTrack": "bytetrack.yaml",
-            "Bot-SORT": "botsort.yaml",
-            "None": None
-        }
+        self.trackers = dict(TRACKERS)
         
         # Model directory setup
         self.model_dir = "models"
         os.makedirs(self.model_dir, exist_ok=True)
+
+        # Inference backend, non-PyTorch backends run an export cached in the model directory
+        self.model_path = None
+        self.inference_backend = "PyTorch"
+        self.backend_latency = {}  # (checkpoint hash, backend, device) -> ms per frame
         
         # Pretrained model options
         self.pretrained_models = {
@@ -156,8 +629,22 @@ class YOLOVideoApp(QWidget):
         self.pretrained_url = "https://github.com/ultralytics/assets/releases/download/v0.0.0/"
 
         self.init_ui()
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_frame)
+
+        # Processing pipeline (capture -> inference -> render), created per run
+        self.capture_worker = None
+        self.inference_worker = None
+        self.render_worker = None
+        self.frame_queue = None
+        self.frame_queue_size = 4
+        self.render_queue_size = 2
+        self.render_queue = None
+        self.retired_converter = None  # Converter of the last stopped run
+        self.live_stats_interval = 0.25  # Seconds between live latency updates in the status bar
+        self.last_live_stats_update = 0.0
+
+        # Refreshes the performance panel while processing
+        self.perf_timer = QTimer()
+        self.perf_timer.timeout.connect(self.update_perf_panel)
         
         # Video playback timer
         self.playback_timer = QTimer()
@@ -181,6 +668,10 @@ class YOLOVideoApp(QWidget):
         self.extract_frame_pos = 0
         self.extract_total_frames = 0
         self.extract_fps = 0
+        # Polls the worker processes of a running frame extraction
+        self.extraction = None
+        self.extraction_timer = QTimer()
+        self.extraction_timer.timeout.connect(self.update_extraction_progress)
 
     def init_ui(self):
         main_splitter = QSplitter(Qt.Orientation.Horizontal)
@@ -590,6 +1081,63 @@ class YOLOVideoApp(QWidget):
         extract_end_time_layout.addWidget(self.extract_end_time_edit)
         extract_time_layout.addLayout(extract_end_time_layout)
         
+        # Image format and quality
+        extract_format_layout = QHBoxLayout()
+        extract_format_label = QLabel("Format:")
+        extract_format_label.setStyleSheet("color: white;")
+        extract_format_layout.addWidget(extract_format_label)
+        
+        self.extract_format_combo = QComboBox()
+        self.extract_format_combo.addItems(IMAGE_FORMATS)
+        self.extract_format_combo.setToolTip("PNG is lossless, its setting is the compression level (0-9)")
+        self.extract_format_combo.setStyleSheet("""
+            QComboBox {
+                background: #4d4d4d;
+                color: white;
+                padding: 5px;
+                border: 1px solid #5d5d5d;
+                border-radius: 4px;
+            }
+            QComboBox::drop-down {
+                border: none;
+            }
+        """)
+        self.extract_format_combo.currentTextChanged.connect(self.update_extract_format)
+        extract_format_layout.addWidget(self.extract_format_combo)
+        
+        self.extract_quality_label = QLabel("Quality:")
+        self.extract_quality_label.setStyleSheet("color: white;")
+        extract_format_layout.addWidget(self.extract_quality_label)
+        
+        self.extract_quality_spinbox = QSpinBox()
+        self.extract_quality_spinbox.setRange(1, 100)
+        self.extract_quality_spinbox.setValue(95)
+        extract_format_layout.addWidget(self.extract_quality_spinbox)
+        extract_time_layout.addLayout(extract_format_layout)
+        
+        # Sampling, frames that aren't kept are skipped without being converted or saved
+        extract_sampling_layout = QHBoxLayout()
+        extract_sampling_label = QLabel("Sampling:")
+        extract_sampling_label.setStyleSheet("color: white;")
+        extract_sampling_layout.addWidget(extract_sampling_label)
+        
+        self.extract_sampling_combo = QComboBox()
+        self.extract_sampling_modes = {
+            "All frames": "all",
+            "Every Nth frame": "every_n",
+            "Every T seconds": "every_seconds",
+            "N frames evenly spread": "evenly",
+        }
+        self.extract_sampling_combo.addItems(self.extract_sampling_modes.keys())
+        self.extract_sampling_combo.setStyleSheet(self.extract_format_combo.styleSheet())
+        self.extract_sampling_combo.currentTextChanged.connect(self.update_extract_sampling_mode)
+        extract_sampling_layout.addWidget(self.extract_sampling_combo)
+        
+        self.extract_sampling_spinbox = QDoubleSpinBox()
+        self.extract_sampling_spinbox.setEnabled(False)
+        extract_sampling_layout.addWidget(self.extract_sampling_spinbox)
+        extract_time_layout.addLayout(extract_sampling_layout)
+        
         extract_time_group.setLayout(extract_time_layout)
         extract_inner_layout.addWidget(extract_time_group)
         
@@ -710,6 +1258,25 @@ class YOLOVideoApp(QWidget):
         self.pretrained_dropdown.currentIndexChanged.connect(self.load_pretrained_model)
         self.pretrained_dropdown.hide()
         model_load_layout.addWidget(self.pretrained_dropdown)
+
+        # Inference backend selection
+        backend_layout = QHBoxLayout()
+        backend_label = QLabel("Backend:")
+        backend_label.setStyleSheet("color: white;")
+        backend_layout.addWidget(backend_label)
+
+        self.backend_combo = QComboBox()
+        self.backend_combo.addItems(BACKENDS.keys())
+        self.backend_combo.setToolTip("ONNX, OpenVINO and TorchScript export the model on first use\n"
+                                      "and reuse the cached export afterwards")
+        self.backend_combo.setStyleSheet(self.pretrained_dropdown.styleSheet())
+        self.backend_combo.currentIndexChanged.connect(self.update_inference_backend)
+        backend_layout.addWidget(self.backend_combo)
+        model_load_layout.addLayout(backend_layout)
+
+        self.backend_speed_label = QLabel("Speed: -")
+        self.backend_speed_label.setStyleSheet("color: #a7c4bc; font-size: 10px;")
+        model_load_layout.addWidget(self.backend_speed_label)
         
         model_load_group.setLayout(model_load_layout)
         loading_layout.addWidget(model_load_group)
@@ -880,6 +1447,25 @@ class YOLOVideoApp(QWidget):
         self.speed_combo.currentIndexChanged.connect(self.change_playback_speed)
         speed_layout.addWidget(self.speed_combo)
         advanced_controls_layout.addLayout(speed_layout)
+
+        # Fast scaling toggle (cheaper display scaling while video is playing or processing)
+        self.fast_scaling_btn = QPushButton("Fast Scaling: OFF")
+        self.fast_scaling_btn.setCheckable(True)
+        self.fast_scaling_btn.setToolTip("Use fast, lower quality scaling while video is playing or processing")
+        self.fast_scaling_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #5e548e;
+                color: white;
+                border: none;
+                padding: 3px 8px;
+                border-radius: 3px;
+            }
+            QPushButton:checked {
+                background-color: #2a9d8f;
+            }
+        """)
+        self.fast_scaling_btn.clicked.connect(self.toggle_fast_scaling)
+        advanced_controls_layout.addWidget(self.fast_scaling_btn)
         
         advanced_controls_layout.addStretch()
         
@@ -1145,6 +1731,89 @@ class YOLOVideoApp(QWidget):
         self.persist_checkbox.clicked.connect(self.toggle_persist)
         detection_layout.addWidget(self.persist_checkbox)
 
+        # Batch size for video files (live streams are always processed frame by frame)
+        batch_layout = QHBoxLayout()
+        batch_label = QLabel("Batch:")
+        batch_label.setStyleSheet("color: white;")
+        batch_layout.addWidget(batch_label)
+
+        self.batch_combo = QComboBox()
+        self.batch_combo.addItems(self.batch_size_options)
+        self.batch_combo.setToolTip("Frames per inference call when processing video files.\n"
+                                    "Auto measures which size gives the best FPS on this machine.")
+        self.batch_combo.setStyleSheet("""
+            QComboBox {
+                background: #4d4d4d;
+                color: white;
+                padding: 3px;
+                border: 1px solid #5d5d5d;
+                border-radius: 3px;
+            }
+        """)
+        self.batch_combo.currentIndexChanged.connect(self.update_batch_size)
+        batch_layout.addWidget(self.batch_combo)
+        detection_layout.addLayout(batch_layout)
+
+        # Adaptive keyframe stride
+        self.adaptive_stride_btn = QPushButton("Adaptive Stride: OFF")
+        self.adaptive_stride_btn.setCheckable(True)
+        self.adaptive_stride_btn.setToolTip("Run the model only on keyframes and move boxes along with the\n"
+                                            "motion in between. The keyframe interval adapts to reach the\n"
+                                            "target FPS and shrinks when objects move fast (detection only).")
+        self.adaptive_stride_btn.setStyleSheet(self.persist_checkbox.styleSheet())
+        self.adaptive_stride_btn.clicked.connect(self.toggle_adaptive_stride)
+        detection_layout.addWidget(self.adaptive_stride_btn)
+
+        target_fps_layout = QHBoxLayout()
+        target_fps_label = QLabel("Target FPS:")
+        target_fps_label.setStyleSheet("color: white;")
+        target_fps_layout.addWidget(target_fps_label)
+
+        self.target_fps_spinbox = QDoubleSpinBox()
+        self.target_fps_spinbox.setRange(1.0, 120.0)
+        self.target_fps_spinbox.setSingleStep(1.0)
+        self.target_fps_spinbox.setDecimals(0)
+        self.target_fps_spinbox.setValue(self.target_fps)
+        self.target_fps_spinbox.valueChanged.connect(self.update_target_fps)
+        target_fps_layout.addWidget(self.target_fps_spinbox)
+        detection_layout.addLayout(target_fps_layout)
+
+        self.stride_info_label = QLabel("Keyframe every: -")
+        self.stride_info_label.setStyleSheet("color: #a7c4bc; font-size: 10px;")
+        detection_layout.addWidget(self.stride_info_label)
+
+        # Motion gate
+        self.motion_gate_btn = QPushButton("Motion Gate: OFF")
+        self.motion_gate_btn.setCheckable(True)
+        self.motion_gate_btn.setToolTip("Skip the model and keep the last detections while the scene is static")
+        self.motion_gate_btn.setStyleSheet(self.persist_checkbox.styleSheet())
+        self.motion_gate_btn.clicked.connect(self.toggle_motion_gate)
+        detection_layout.addWidget(self.motion_gate_btn)
+
+        sensitivity_layout = QHBoxLayout()
+        sensitivity_label = QLabel("Sensitivity:")
+        sensitivity_label.setStyleSheet("color: white;")
+        sensitivity_layout.addWidget(sensitivity_label)
+
+        self.motion_sensitivity_slider = QSlider(Qt.Orientation.Horizontal)
+        self.motion_sensitivity_slider.setRange(0, 100)
+        self.motion_sensitivity_slider.setValue(int(self.motion_sensitivity * 100))
+        self.motion_sensitivity_slider.valueChanged.connect(self.update_motion_sensitivity)
+        sensitivity_layout.addWidget(self.motion_sensitivity_slider)
+        detection_layout.addLayout(sensitivity_layout)
+
+        self.motion_regions_btn = QPushButton("Changed Regions Only: OFF")
+        self.motion_regions_btn.setCheckable(True)
+        self.motion_regions_btn.setToolTip("When motion is detected, run the model only on the changed area\n"
+                                           "and keep the earlier detections elsewhere (detection only)")
+        self.motion_regions_btn.setStyleSheet(self.persist_checkbox.styleSheet())
+        self.motion_regions_btn.clicked.connect(self.toggle_motion_regions)
+        detection_layout.addWidget(self.motion_regions_btn)
+
+        self.motion_gate_info_label = QLabel("Skipped frames: -")
+        self.motion_gate_info_label.setStyleSheet("color: #a7c4bc; font-size: 10px;")
+        detection_layout.addWidget(self.motion_gate_info_label)
+
         detection_group.setLayout(detection_layout)
         right_layout.addWidget(detection_group)
 
@@ -1204,6 +1873,37 @@ class YOLOVideoApp(QWidget):
         tracking_group.setLayout(tracking_layout)
         right_layout.addWidget(tracking_group)
 
+        # Performance Group
+        perf_group = QGroupBox("Performance")
+        perf_group.setStyleSheet(resource_group.styleSheet())
+        perf_layout = QVBoxLayout()
+
+        self.perf_stats_label = QLabel("Stage times p50 / p95 / p99:\n-")
+        self.perf_stats_label.setStyleSheet("color: #a7c4bc; font-family: monospace; font-size: 10px;")
+        perf_layout.addWidget(self.perf_stats_label)
+
+        self.perf_overlay_btn = QPushButton("Perf Overlay: OFF")
+        self.perf_overlay_btn.setCheckable(True)
+        self.perf_overlay_btn.setToolTip("Draw the live stage timings onto the processed video")
+        self.perf_overlay_btn.setStyleSheet(self.persist_checkbox.styleSheet())
+        self.perf_overlay_btn.clicked.connect(self.toggle_perf_overlay)
+        perf_layout.addWidget(self.perf_overlay_btn)
+
+        perf_export_layout = QHBoxLayout()
+        self.export_perf_csv_btn = QPushButton("Export CSV")
+        self.export_perf_csv_btn.setStyleSheet(self.persist_checkbox.styleSheet())
+        self.export_perf_csv_btn.clicked.connect(self.export_perf_csv)
+        perf_export_layout.addWidget(self.export_perf_csv_btn)
+        self.export_perf_trace_btn = QPushButton("Export Trace")
+        self.export_perf_trace_btn.setToolTip("Chrome trace, open in chrome://tracing or ui.perfetto.dev")
+        self.export_perf_trace_btn.setStyleSheet(self.persist_checkbox.styleSheet())
+        self.export_perf_trace_btn.clicked.connect(self.export_perf_trace)
+        perf_export_layout.addWidget(self.export_perf_trace_btn)
+        perf_layout.addLayout(perf_export_layout)
+
+        perf_group.setLayout(perf_layout)
+        right_layout.addWidget(perf_group)
+
         right_layout.addStretch()
         right_panel.setLayout(right_layout)
         main_splitter.addWidget(right_panel)
@@ -1219,6 +1919,7 @@ class YOLOVideoApp(QWidget):
 
         # Connect double click signal
         self.video_label.doubleClicked.connect(self.toggle_fullscreen)
+        self.video_label.displaySizeChanged.connect(self.update_display_size)
 
     def toggle_fullscreen(self):
         if self.isFullScreen():
@@ -1414,12 +2115,18 @@ class YOLOVideoApp(QWidget):
         # Reload model with new device if already loaded
         if self.model is not None:
             try:
-                model_path = self.model.ckpt_path if hasattr(self.model, 'ckpt_path') else None
-                if model_path:
-                    self.load_model_file(model_path)
+                if self.model_path:
+                    self.load_model_file(self.model_path)
             except Exception as e:
                 self.status_label.setText(f"Status: Error switching device - {str(e)}")
 
+    def update_inference_backend(self, index):
+        """Handle inference backend changes, reloading the current model"""
+        self.inference_backend = self.backend_combo.itemText(index)
+        self.status_label.setText(f"Status: Inference backend set to {self.inference_backend}")
+        if self.model is not None and self.model_path:
+            self.load_model_file(self.model_path)
+
     def update_confidence(self, value):
         self.confidence = value / 100.0
         self.confidence_spinbox.setValue(self.confidence)
@@ -1432,6 +2139,81 @@ class YOLOVideoApp(QWidget):
         self.persist = checked
         self.persist_checkbox.setText(f"Persist: {'ON' if checked else 'OFF'}")
 
+    def toggle_adaptive_stride(self, checked):
+        self.adaptive_stride = checked
+        self.adaptive_stride_btn.setText(f"Adaptive Stride: {'ON' if checked else 'OFF'}")
+        if not checked:
+            self.stride_info_label.setText("Keyframe every: -")
+
+    def update_target_fps(self, value):
+        self.target_fps = value
+        if self.inference_worker is not None and self.inference_worker.stride_controller is not None:
+            self.inference_worker.stride_controller.target_fps = value
+
+    def on_stride_changed(self, stride):
+        self.stride_info_label.setText(f"Keyframe every: {stride} frame{'s' if stride > 1 else ''}")
+
+    def toggle_motion_gate(self, checked):
+        self.motion_gate_enabled = checked
+        self.motion_gate_btn.setText(f"Motion Gate: {'ON' if checked else 'OFF'}")
+        if not checked:
+            self.motion_gate_info_label.setText("Skipped frames: -")
+
+    def update_motion_sensitivity(self, value):
+        self.motion_sensitivity = value / 100.0
+
+    def toggle_motion_regions(self, checked):
+        self.motion_regions = checked
+        self.motion_regions_btn.setText(f"Changed Regions Only: {'ON' if checked else 'OFF'}")
+
+    def toggle_perf_overlay(self, checked):
+        self.perf_overlay = checked
+        self.perf_overlay_btn.setText(f"Perf Overlay: {'ON' if checked else 'OFF'}")
+        if self.render_worker is not None:
+            self.render_worker.show_overlay = checked
+
+    def update_perf_panel(self):
+        """Refresh the drop counters and the stage times shown in the performance panel"""
+        perf = self.perf_recorder
+        if perf is None:
+            return
+        if self.frame_queue is not None:
+            perf.set_counter("dropped (capture)", self.frame_queue.dropped)
+        if self.render_queue is not None:
+            perf.set_counter("dropped (render)", self.render_queue.dropped)
+        if self.render_worker is not None:
+            perf.set_counter("dropped (display)", self.render_worker.skipped_display)
+        self.perf_stats_label.setText("Stage times p50 / p95 / p99:\n" + "\n".join(perf.format_lines()))
+
+    def export_perf_csv(self):
+        self.export_perf("Export Performance CSV", "CSV Files (*.csv)", ".csv", "export_csv")
+
+    def export_perf_trace(self):
+        self.export_perf("Export Performance Trace", "Trace Files (*.json)", ".json", "export_chrome_trace")
+
+    def export_perf(self, title, file_filter, extension, method):
+        """Save the spans recorded during the current or last run"""
+        if self.perf_recorder is None:
+            self.status_label.setText("Status: No performance data yet, process a video first")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, title, f"perf_{datetime.now():%Y%m%d_%H%M%S}{extension}",
+                                              file_filter)
+        if not path:
+            return
+        try:
+            getattr(self.perf_recorder, method)(path)
+            self.status_label.setText(f"Status: Performance data saved to {path}")
+        except Exception as e:
+            self.status_label.setText(f"Status: Error saving performance data - {str(e)}")
+
+    def on_gate_stats(self, skipped, total):
+        share = skipped / total * 100 if total else 0
+        self.motion_gate_info_label.setText(f"Skipped frames: {share:.0f}% ({skipped}/{total})")
+
+    def update_batch_size(self, index):
+        text = self.batch_combo.itemText(index)
+        self.batch_size = "auto" if text == "Auto" else int(text)
+
     def update_tracker(self, index):
         tracker_name = self.tracker_dropdown.currentText()
         self.tracker_type = self.trackers[tracker_name]
@@ -1458,7 +2240,7 @@ class YOLOVideoApp(QWidget):
                 if hasattr(self, 'extract_cap') and self.extract_cap:
                     self.extract_cap.release()
                 
-                self.extract_cap = cv2.VideoCapture(file_name)
+                self.extract_cap = open_source(file_name)
                 if not self.extract_cap.isOpened():
                     raise ValueError("Could not open video file")
                 
@@ -1572,6 +2354,34 @@ class YOLOVideoApp(QWidget):
             seconds = int(current_time_sec % 60)
             self.extract_time_label.setText(f"Current Time: {hours:02d}:{minutes:02d}:{seconds:02d}")
 
+    def update_extract_format(self, image_format):
+        """Use the value box as the quality, or as the compression level for PNG"""
+        spinbox = self.extract_quality_spinbox
+        if image_format == "png":
+            self.extract_quality_label.setText("Compression:")
+            spinbox.setRange(0, 9)
+            spinbox.setValue(3)
+        else:
+            self.extract_quality_label.setText("Quality:")
+            spinbox.setRange(1, 100)
+            spinbox.setValue(90 if image_format == "webp" else 95)
+
+    def update_extract_sampling_mode(self, label):
+        """Set up the value box for the selected sampling mode"""
+        mode = self.extract_sampling_modes[label]
+        spinbox = self.extract_sampling_spinbox
+        spinbox.setEnabled(mode != "all")
+        if mode == "every_seconds":
+            spinbox.setDecimals(2)
+            spinbox.setRange(0.01, 3600)
+            spinbox.setSuffix(" s")
+            spinbox.setValue(1.0)
+        elif mode != "all":
+            spinbox.setDecimals(0)
+            spinbox.setRange(1, 1000000)
+            spinbox.setSuffix(" frames" if mode == "evenly" else "")
+            spinbox.setValue(100 if mode == "evenly" else 10)
+
     def extract_frames(self):
         """Extract frames between specified start and end times"""
         if not hasattr(self, 'extract_video_path') or not os.path.exists(self.extract_video_path):
@@ -1607,57 +2417,72 @@ class YOLOVideoApp(QWidget):
             output_path = os.path.join(output_dir, f"frames_{timestamp}")
             os.makedirs(output_path, exist_ok=True)
             
-            # Open the video file
-            cap = cv2.VideoCapture(self.extract_video_path)
-            
             # Calculate start and end frame numbers
             start_frame = int(start_sec * self.extract_fps)
             end_frame = int(end_sec * self.extract_fps)
             
-            # Seek to start frame
-            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-            
-            # Process frames
-            current_frame = start_frame
-            frame_count = 0
-            self.status_label.setText("Status: Extracting frames...")
-            QApplication.processEvents()  # Update UI
+            # Only the sampled frames are converted and saved
+            frames = sample_frames(
+                start_frame, end_frame, self.extract_fps,
+                self.extract_sampling_modes[self.extract_sampling_combo.currentText()],
+                self.extract_sampling_spinbox.value()
+            )
             
-            while current_frame <= end_frame and cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                    
-                # Save frame
-                frame_path = os.path.join(output_path, f"frame_{current_frame:06d}.jpg")
-                cv2.imwrite(frame_path, frame)
-                frame_count += 1
-                current_frame += 1
-                
-                # Update progress every 10 frames
-                if current_frame % 10 == 0:
-                    progress = (current_frame - start_frame) / (end_frame - start_frame) * 100
-                    self.status_label.setText(f"Status: Extracting frames... {progress:.1f}%")
-                    QApplication.processEvents()  # Update UI
-            
-            # Release resources
-            cap.release()
-            
-            self.status_label.setText(f"Status: Extracted {frame_count} frames to {os.path.basename(output_path)}")
-            QMessageBox.information(self, "Success", f"Frame extraction completed!\nSaved {frame_count} frames to:\n{output_path}")
+            # Worker processes decode segments of the range in parallel, the timer polls their progress
+            image_format = self.extract_format_combo.currentText()
+            self.extraction = ParallelExtraction(
+                self.extract_video_path, frames, output_path,
+                image_format=image_format,
+                quality=None if image_format == "png" else self.extract_quality_spinbox.value(),
+                png_compression=self.extract_quality_spinbox.value() if image_format == "png" else 3
+            )
+            self.extraction.start()
+            self.extract_frames_btn.setEnabled(False)
+            self.status_label.setText(
+                f"Status: Extracting frames with {len(self.extraction.segments)} worker processes..."
+            )
+            self.extraction_timer.start(200)
             
         except Exception as e:
+            self.extraction = None
             self.status_label.setText(f"Status: Error extracting frames - {str(e)}")
             QMessageBox.critical(self, "Error", f"Failed to extract frames:\n{str(e)}")
             
             # Clean up if something went wrong
-            if 'cap' in locals() and cap.isOpened():
-                cap.release()
+            if 'output_path' in locals() and os.path.exists(output_path):
+                try:
+                    os.rmdir(output_path)  # Remove directory if empty
+                except:
+                    pass
+
+    def update_extraction_progress(self):
+        """Show the progress of a running frame extraction and report when it ends"""
+        extraction = self.extraction
+        if extraction is None:
+            self.extraction_timer.stop()
+            return
+        frame_count = extraction.poll()
+        if not extraction.finished:
+            self.status_label.setText(f"Status: Extracting frames... {extraction.progress * 100:.1f}%")
+            return
+        
+        self.extraction_timer.stop()
+        extraction.join()
+        self.extraction = None
+        self.extract_frames_btn.setEnabled(self.extract_video_path is not None)
+        output_path = extraction.output_path
+        if extraction.errors:
+            self.status_label.setText(f"Status: Error extracting frames - {extraction.errors[0]}")
+            QMessageBox.critical(self, "Error", "Failed to extract frames:\n" + "\n".join(extraction.errors))
             if os.path.exists(output_path):
                 try:
                     os.rmdir(output_path)  # Remove directory if empty
                 except:
                     pass
+            return
+        
+        self.status_label.setText(f"Status: Extracted {frame_count} frames to {os.path.basename(output_path)}")
+        QMessageBox.information(self, "Success", f"Frame extraction completed!\nSaved {frame_count} frames to:\n{output_path}")
 
     def load_video_for_trimming(self):
         """Handle video file loading for trimming"""
@@ -1676,7 +2501,7 @@ class YOLOVideoApp(QWidget):
                 if hasattr(self, 'trim_cap') and self.trim_cap:
                     self.trim_cap.release()
                 
-                self.trim_cap = cv2.VideoCapture(file_name)
+                self.trim_cap = open_source(file_name)
                 if not self.trim_cap.isOpened():
                     raise ValueError("Could not open video file")
                 
@@ -1830,7 +2655,7 @@ class YOLOVideoApp(QWidget):
             
         try:
             # Open the video file
-            cap = cv2.VideoCapture(self.trim_video_path)
+            cap = open_source(self.trim_video_path)
             fps = cap.get(cv2.CAP_PROP_FPS)
             width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -1913,7 +2738,7 @@ class YOLOVideoApp(QWidget):
             
             # Try to open the video file to verify it's actually a video
             try:
-                cap = cv2.VideoCapture(file_name)
+                cap = open_source(file_name)
                 if not cap.isOpened():
                     raise ValueError("Could not open video file")
                 
@@ -1924,7 +2749,7 @@ class YOLOVideoApp(QWidget):
                 
                 # Release the test capture and create a new one
                 cap.release()
-                self.cap = cv2.VideoCapture(file_name)
+                self.cap = open_source(file_name)
                 
                 self.video_path = file_name
                 self.image_path = None  # Clear any loaded image
@@ -1937,7 +2762,10 @@ class YOLOVideoApp(QWidget):
                 # Enable VLC-like playback controls
                 self.enable_playback_controls(True)
                 
-                self.status_label.setText(f"Status: Video loaded - {os.path.basename(file_name)}")
+                self.status_label.setText(
+                    f"Status: Video loaded - {os.path.basename(file_name)} "
+                    f"({self.cap.name} decoder, {self.cap.decode_threads or 'auto'} threads)"
+                )
                 
                 # Reset progress bar and time labels
                 self.progress_bar.setValue(0)
@@ -2040,60 +2868,12 @@ class YOLOVideoApp(QWidget):
                 raise ValueError("Could not read image file")
             
             # Process based on task type
-            if self.task_type == "detection":
-                results = self.model.predict(
-                    frame,
-                    conf=self.confidence,
-                    classes=[self.selected_class]
-                )
-                
-                for r in results:
-                    for box in r.boxes:
-                        cls_id = int(box.cls[0])
-                        conf = float(box.conf[0])
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        
-                        label = f"{self.model.names[cls_id]} {conf:.2f}"
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                        cv2.putText(frame, label, (x1, y1 - 10),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-            
-            elif self.task_type == "segmentation":
-                results = self.model.predict(
-                    frame,
-                    conf=self.confidence,
-                    classes=[self.selected_class]
-                )
-                
-                for r in results:
-                    # Draw segmentation masks if available
-                    if hasattr(r, 'masks') and r.masks is not None:
-                        for mask in r.masks:
-                            # Get the mask as a numpy array
-                            mask_data = mask.data[0].cpu().numpy()
-                            mask_data = cv2.resize(mask_data, (frame.shape[1], frame.shape[0]))
-                            
-                            # Create a colored mask overlay
-                            color_mask = (0, 255, 0)  # Green color for segmentation
-                            colored_mask = np.zeros_like(frame)
-                            colored_mask[:] = color_mask
-                            
-                            # Apply mask
-                            mask_bool = mask_data > 0.5
-                            frame[mask_bool] = cv2.addWeighted(frame, 0.7, colored_mask, 0.3, 0)[mask_bool]
-                            
-                            # Draw bounding box
-                            if hasattr(mask, 'boxes') and mask.boxes is not None:
-                                box = mask.boxes[0]
-                                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                                
-                                # Draw label
-                                cls_id = int(box.cls[0])
-                                conf = float(box.conf[0])
-                                label = f"{self.model.names[cls_id]} {conf:.2f}"
-                                cv2.putText(frame, label, (x1, y1 - 10),
-                                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            results = self.model.predict(
+                frame,
+                conf=self.confidence,
+                classes=[self.selected_class]
+            )
+            draw_results(frame, results, self.model.names, self.task_type)
             
             self.display_frame(frame)
             self.status_label.setText(f"Status: Image processed ({self.task_type})")
@@ -2110,7 +2890,7 @@ class YOLOVideoApp(QWidget):
             return
         
         # Test the connection first
-        test_cap = cv2.VideoCapture(rtsp_url)
+        test_cap = open_source(rtsp_url, reconnect_attempts=0)
         if not test_cap.isOpened():
             QMessageBox.critical(self, "Connection Error", "Failed to connect to RTSP stream")
             test_cap.release()
@@ -2121,7 +2901,8 @@ class YOLOVideoApp(QWidget):
         
         try:
             # Set up RTSP stream with buffer size adjustment
-            self.cap = cv2.VideoCapture(rtsp_url)
+            # Playback reads on the GUI thread, reconnecting is left to the capture worker
+            self.cap = open_source(rtsp_url, reconnect_attempts=0)
             self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Reduce buffer size for RTSP
             
             if not self.cap.isOpened():
@@ -2149,7 +2930,7 @@ class YOLOVideoApp(QWidget):
             # Enable playback controls for RTSP
             self.enable_playback_controls(True)
             
-            self.status_label.setText(f"Status: Connected to RTSP stream")
+            self.status_label.setText(f"Status: Connected to RTSP stream ({self.cap.name} decoder)")
             
             # Reset progress bar and time labels
             self.progress_bar.setValue(0)
@@ -2179,7 +2960,7 @@ class YOLOVideoApp(QWidget):
         QApplication.processEvents()  # Update UI
         
         try:
-            cap = cv2.VideoCapture(rtsp_url)
+            cap = open_source(rtsp_url, reconnect_attempts=0)
             if not cap.isOpened():
                 raise ConnectionError("Failed to open RTSP stream")
             
@@ -2204,13 +2985,32 @@ class YOLOVideoApp(QWidget):
 
     def display_frame(self, frame):
         """Display a frame in the video label"""
-        rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_image.shape
-        bytes_per_line = ch * w
-        qt_image = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
+        self.display_converter.fast = self.fast_scaling_active()
+        self.display_image(self.display_converter.convert(frame))
+
+    def display_image(self, qt_image):
+        """Display an already converted QImage in the video label"""
+        self.video_label.fast_scaling = self.fast_scaling_active()
         pixmap = QPixmap.fromImage(qt_image)
         self.video_label.setPixmap(pixmap)
 
+    def fast_scaling_active(self):
+        """Fast scaling is only used while video is moving, still frames stay smooth"""
+        moving = self.processing or self.video_playing or self.trim_playing or self.extract_playing
+        return self.fast_scaling and moving
+
+    def toggle_fast_scaling(self, checked):
+        self.fast_scaling = checked
+        self.fast_scaling_btn.setText(f"Fast Scaling: {'ON' if checked else 'OFF'}")
+        if self.render_worker is not None:
+            self.render_worker.converter.fast = checked
+
+    def update_display_size(self, width, height):
+        """Keep the frame converters scaling to the current label size"""
+        self.display_converter.set_target_size(width, height)
+        if self.render_worker is not None:
+            self.render_worker.converter.set_target_size(width, height)
+
     def load_custom_model(self):
         """Handle custom model loading"""
         self.pretrained_dropdown.hide()
@@ -2262,27 +3062,25 @@ class YOLOVideoApp(QWidget):
     def load_model_file(self, model_path):
         """Load model from file with improved segmentation support"""
         try:
-            self.model = YOLO(model_path).to(self.device)
+            if self.inference_backend != "PyTorch":
+                self.status_label.setText(f"Status: Preparing {self.inference_backend} model "
+                                          f"(exported on first use)...")
+                QApplication.processEvents()  # Update UI
+            self.model, self.is_segmentation_model = load_model(
+                model_path, self.device, self.inference_backend, cache_dir=self.model_dir
+            )
+            self.model_path = model_path
             self.class_names = self.model.names
             
-            # Check if model supports segmentation
-            self.is_segmentation_model = False
-            try:
-                # Try to get model task type (newer versions of ultralytics)
-                model_task = self.model.task
-                self.is_segmentation_model = model_task == 'segment'
-            except:
-                # Fallback for older versions - check model filename or architecture
-                if '-seg' in model_path.lower() or 'segment' in model_path.lower():
-                    self.is_segmentation_model = True
-            
             self.populate_class_dropdown()
             self.class_dropdown.setEnabled(True)
             
             # Update current model name with device info
             self.current_model_name = os.path.basename(model_path)
             device_info = "GPU" if 'cuda' in str(self.device) else "CPU"
-            self.current_model_label.setText(f"Current Model: {self.current_model_name} ({device_info})")
+            self.current_model_label.setText(
+                f"Current Model: {self.current_model_name} ({device_info}, {self.inference_backend})"
+            )
             
             # Enable segmentation radio button if model supports it
             self.segmentation_radio.setEnabled(self.is_segmentation_model)
@@ -2298,11 +3096,40 @@ class YOLOVideoApp(QWidget):
                 self.start_btn.setEnabled(True)
             if self.image_path:
                 self.process_image_btn.setEnabled(True)
+
+            self.update_backend_speed()
                 
         except Exception as e:
             self.status_label.setText(f"Status: Error loading model - {str(e)}")
             QMessageBox.critical(self, "Load Error", f"Failed to load model: {str(e)}")
 
+    def update_backend_speed(self):
+        """Measure the loaded model and show its speed next to the backend choice"""
+        try:
+            self.backend_speed_label.setText("Speed: measuring...")
+            QApplication.processEvents()  # Update UI
+
+            checkpoint_hash = file_hash(self.model_path)
+            key = (checkpoint_hash, self.inference_backend, self.device)
+            if key not in self.backend_latency:
+                self.backend_latency[key] = measure_latency(self.model)
+            latency = self.backend_latency[key]
+
+            if self.inference_backend == "PyTorch":
+                self.backend_speed_label.setText(f"Speed: {latency:.0f} ms/frame")
+                return
+
+            # The PyTorch baseline is measured once per checkpoint and device
+            baseline_key = (checkpoint_hash, "PyTorch", self.device)
+            if baseline_key not in self.backend_latency:
+                baseline_model, _ = load_model(self.model_path, self.device)
+                self.backend_latency[baseline_key] = measure_latency(baseline_model)
+            speedup = self.backend_latency[baseline_key] / latency
+            self.backend_speed_label.setText(f"Speed: {latency:.0f} ms/frame ({speedup:.1f}x vs PyTorch)")
+        except Exception as e:
+            self.backend_speed_label.setText("Speed: n/a")
+            print(f"Backend speed measurement failed: {str(e)}")
+
     def populate_class_dropdown(self):
         self.class_dropdown.clear()
         if self.class_names:
@@ -2332,122 +3159,164 @@ class YOLOVideoApp(QWidget):
         self.processing = True
         self.start_btn.setEnabled(False)
         self.stop_btn.setEnabled(True)
-        self.timer.start(30)
+        # Playback controls share the capture with the pipeline, keep them off while processing
+        self.pause_playback()
+        self.enable_playback_controls(False)
+        self.start_pipeline()
         self.status_label.setText(f"Status: Processing video ({self.task_type})...")
 
     def stop_processing(self):
         self.processing = False
-        self.timer.stop()
+        self.stop_pipeline()
         self.start_btn.setEnabled(True)
         self.stop_btn.setEnabled(False)
+        if self.cap and self.cap.isOpened():
+            self.enable_playback_controls(True)
         self.status_label.setText("Status: Processing stopped")
 
-    def update_frame(self):
-        if not self.processing:
-            return
-            
-        if self.cap and self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if not ret:
-                self.cap.release()
-                self.timer.stop()
-                self.start_btn.setEnabled(True)
-                self.stop_btn.setEnabled(False)
-                self.status_label.setText("Status: Video ended")
-                return
+    def processing_settings(self):
+        """Snapshot of the detection settings, read by the inference worker for every frame"""
+        return {
+            "confidence": self.confidence,
+            "selected_class": self.selected_class,
+            "task_type": self.task_type,
+            "tracker_type": self.tracker_type,
+            "persist": self.persist,
+            "motion_sensitivity": self.motion_sensitivity,
+            "motion_regions": self.motion_regions,
+        }
 
-            if self.model and self.selected_class is not None:
-                # Prepare tracking arguments if tracker is selected
-                tracker_args = None
-                if self.tracker_type and self.task_type == "detection":  # Tracking only for detection
-                    tracker_args = {
-                        "tracker": self.tracker_type,
-                        "persist": self.persist
-                    }
-                
-                # Run inference based on selected task type
-                if self.task_type == "detection":
-                    results = self.model.predict(
-                        frame, 
-                        conf=self.confidence,
-                        classes=[self.selected_class],
-                        **({"tracker": tracker_args} if tracker_args else {})
-                    )
-                    
-                    for r in results:
-                        for box in r.boxes:
-                            cls_id = int(box.cls[0])
-                            conf = float(box.conf[0])
-                            x1, y1, x2, y2 = map(int, box.xyxy[0])
-                            track_id = int(box.id[0]) if box.id is not None else None
-                            
-                            label = f"{self.model.names[cls_id]} {conf:.2f}"
-                            if track_id is not None:
-                                label += f" ID:{track_id}"
-                                
-                            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                            cv2.putText(frame, label, (x1, y1 - 10),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-                
-                elif self.task_type == "segmentation":
-                    try:
-                        results = self.model.predict(
-                            frame,
-                            conf=self.confidence,
-                            classes=[self.selected_class]
-                        )
-                        
-                        for r in results:
-                            # Draw segmentation masks if available
-                            if hasattr(r, 'masks') and r.masks is not None:
-                                for mask in r.masks:
-                                    # Get the mask as a numpy array
-                                    mask_data = mask.data[0].cpu().numpy()
-                                    mask_data = cv2.resize(mask_data, (frame.shape[1], frame.shape[0]))
-                                    
-                                    # Create a colored mask overlay
-                                    color_mask = (0, 255, 0)  # Green color for segmentation
-                                    colored_mask = np.zeros_like(frame)
-                                    colored_mask[:] = color_mask
-                                    
-                                    # Apply mask
-                                    mask_bool = mask_data > 0.5
-                                    frame[mask_bool] = cv2.addWeighted(frame, 0.7, colored_mask, 0.3, 0)[mask_bool]
-                                    
-                                    # Draw bounding box
-                                    if hasattr(mask, 'boxes') and mask.boxes is not None:
-                                        box = mask.boxes[0]
-                                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                                        
-                                        # Draw label
-                                        cls_id = int(box.cls[0])
-                                        conf = float(box.conf[0])
-                                        label = f"{self.model.names[cls_id]} {conf:.2f}"
-                                        cv2.putText(frame, label, (x1, y1 - 10),
-                                                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-                    except Exception as e:
-                        print(f"Segmentation error: {str(e)}")
-                        self.status_label.setText(f"Status: Segmentation error - {str(e)}")
+    def start_pipeline(self):
+        """Start the capture, inference and render workers"""
+        is_live = self.is_live_source()
+        if is_live:
+            # Keep only the newest frame so detection latency stays bounded
+            batch_size = 1
+            frame_queue = FrameQueue(1, drop_oldest=True)
+        else:
+            # Files must not lose any frames, the decoder waits for inference instead
+            batch_size = self.batch_size
+            max_batch = max(InferenceWorker.auto_batch_candidates) if batch_size == "auto" else batch_size
+            frame_queue = FrameQueue(max(self.frame_queue_size, 2 * max_batch), drop_oldest=False)
+        render_queue = FrameQueue(self.render_queue_size, drop_oldest=True)
+        self.frame_queue = frame_queue
+        self.render_queue = render_queue
+        self.perf_recorder = PerfRecorder()
+
+        # Keyframes and motion checks are decided one frame at a time, so batching doesn't apply
+        stride_controller = None
+        if self.adaptive_stride:
+            stride_controller = StrideController(self.target_fps)
+            batch_size = 1
+            self.on_stride_changed(stride_controller.stride)
+        motion_gate = None
+        if self.motion_gate_enabled:
+            motion_gate = MotionGate(self.motion_sensitivity)
+            batch_size = 1
+
+        self.capture_worker = CaptureWorker(self.cap, frame_queue, perf=self.perf_recorder)
+        self.inference_worker = InferenceWorker(self.model, self.processing_settings, frame_queue, render_queue,
+                                                batch_size=batch_size, stride_controller=stride_controller,
+                                                motion_gate=motion_gate, perf=self.perf_recorder)
+        self.render_worker = RenderWorker(self.model.names, render_queue, perf=self.perf_recorder)
+        self.render_worker.show_overlay = self.perf_overlay
+        self.render_worker.converter.set_target_size(self.video_label.width(), self.video_label.height())
+        self.render_worker.converter.fast = self.fast_scaling
+
+        self.inference_worker.error_occurred.connect(self.on_pipeline_error)
+        self.inference_worker.batch_size_selected.connect(self.on_batch_size_selected)
+        self.inference_worker.stride_changed.connect(self.on_stride_changed)
+        self.inference_worker.gate_stats.connect(self.on_gate_stats)
+        self.render_worker.error_occurred.connect(self.on_pipeline_error)
+        self.render_worker.frame_ready.connect(self.on_pipeline_frame)
+        self.render_worker.finished.connect(self.on_pipeline_finished)
+
+        self.render_worker.start()
+        self.inference_worker.start()
+        self.capture_worker.start()
+        self.perf_timer.start(500)
+
+    def stop_pipeline(self):
+        """Stop all pipeline workers and wait for them to exit"""
+        self.perf_timer.stop()
+        for worker in (self.capture_worker, self.inference_worker, self.render_worker):
+            if worker is not None:
+                worker.requestInterruption()
+        # A file source's producer blocks in put() while the queue is full, closing releases it
+        for frame_queue in (self.frame_queue, self.render_queue):
+            if frame_queue is not None:
+                frame_queue.close()
+        for worker in (self.capture_worker, self.inference_worker, self.render_worker):
+            if worker is not None:
+                worker.wait()
+        self.capture_worker = None
+        self.inference_worker = None
+        self.update_perf_panel()  # Final numbers, the recorder is kept for export
+        # frame_ready images still queued for the GUI wrap the converter's buffers, keep it until the next stop
+        self.retired_converter = self.render_worker.converter if self.render_worker is not None else None
+        self.render_worker = None
+        self.frame_queue = None
+        self.render_queue = None
+
+    def is_live_source(self):
+        """True for RTSP streams and other sources without a known length"""
+        return self.video_total_frames <= 0 or not os.path.exists(str(self.video_path))
+
+    def on_pipeline_frame(self, qt_image, captured_at):
+        """Show a rendered frame coming from the pipeline"""
+        start = time.perf_counter()
+        self.display_image(qt_image)
+        if self.perf_recorder is not None:
+            self.perf_recorder.record("display", start, time.perf_counter() - start, "gui")
+        if self.render_worker is not None:
+            self.render_worker.frame_displayed()
+
+        if self.frame_queue is not None and self.frame_queue.drop_oldest:
+            now = time.monotonic()
+            if now - self.last_live_stats_update >= self.live_stats_interval:
+                self.last_live_stats_update = now
+                age_ms = (now - captured_at) * 1000
+                self.status_label.setText(
+                    f"Status: Live ({self.task_type}) - frame age {age_ms:.0f} ms, "
+                    f"dropped {self.frame_queue.dropped} frames"
+                )
 
-            self.display_frame(frame)
+    def on_batch_size_selected(self, batch_size):
+        self.status_label.setText(f"Status: Processing video ({self.task_type}), auto batch size {batch_size}...")
+
+    def on_pipeline_error(self, message):
+        self.status_label.setText(f"Status: {message}")
+
+    def on_pipeline_finished(self):
+        """Called when the render stage exits, either after a stop or at the end of the video"""
+        if not self.processing:
+            return
+        self.processing = False
+        self.stop_pipeline()
+        self.cap.release()
+        self.start_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
+        self.status_label.setText("Status: Video ended")
 
     def closeEvent(self, event):
         """Clean up resources when closing the application"""
+        self.processing = False
+        self.stop_pipeline()
         if hasattr(self, 'cap') and self.cap:
             self.cap.release()
         if hasattr(self, 'trim_cap') and self.trim_cap:
             self.trim_cap.release()
         if hasattr(self, 'extract_cap') and self.extract_cap:
             self.extract_cap.release()
-        if hasattr(self, 'timer') and self.timer.isActive():
-            self.timer.stop()
         if hasattr(self, 'playback_timer') and self.playback_timer.isActive():
             self.playback_timer.stop()
         if hasattr(self, 'trim_timer') and self.trim_timer.isActive():
             self.trim_timer.stop()
         if hasattr(self, 'extract_timer') and self.extract_timer.isActive():
             self.extract_timer.stop()
+        if self.extraction is not None:
+            self.extraction_timer.stop()
+            self.extraction.cancel()
         event.accept()
 
 
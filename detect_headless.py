@@ -0,0 +1,170 @@
+"""Headless batch runner for the YOLO detector.
+
+Runs the same model loading, class filtering, tracker and confidence logic as the
+GUI over one video or a whole folder of videos, several videos at a time, and
+writes an annotated video plus a JSON Lines detections file for each input.
+
+    python Detect.py --headless --model yolo11n.pt --class 0 --input dir/ --out results/
+
+Never imports PyQt6, so it runs on servers without a display.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import torch
+
+from detection_core import (
+    TRACKERS, BACKENDS, VIDEO_EXTENSIONS, MaskRenderer, default_device, export_model, load_model,
+    make_settings, run_inference, draw_results, results_to_records
+)
+from frame_source import BACKEND_NAMES, open_source
+
+# Model loaded once per worker process by init_worker
+_worker_model = None
+_worker_is_segmentation = False
+
+
+def find_videos(input_path):
+    """Return the video files to process for a file or directory argument"""
+    if os.path.isfile(input_path):
+        return [input_path]
+    videos = []
+    for name in sorted(os.listdir(input_path)):
+        if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS:
+            videos.append(os.path.join(input_path, name))
+    return videos
+
+
+def init_worker(model_path, device, backend, torch_threads):
+    """Load the model once per worker process"""
+    global _worker_model, _worker_is_segmentation
+    # Split the cores between workers instead of every worker using all of them
+    torch.set_num_threads(torch_threads)
+    _worker_model, _worker_is_segmentation = load_model(model_path, device, backend)
+
+
+def process_video(video_path, out_dir, settings, decoder="auto"):
+    """Detect on every frame of a video, write the annotated video and the detections file"""
+    model = _worker_model
+    if settings["task_type"] == "segmentation" and not _worker_is_segmentation:
+        raise ValueError("Model does not support segmentation")
+
+    cap = open_source(video_path, backend=decoder)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file: {video_path}")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    video_out_path = os.path.join(out_dir, f"{stem}_annotated.mp4")
+    detections_path = os.path.join(out_dir, f"{stem}_detections.jsonl")
+
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    out = cv2.VideoWriter(video_out_path, fourcc, fps, (width, height))
+
+    mask_renderer = MaskRenderer()
+    frame_index = 0
+    detection_count = 0
+    start = time.perf_counter()
+    try:
+        with open(detections_path, "w") as detections_file:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+
+                results = run_inference(model, frame, settings)
+                records = results_to_records(results, model.names)
+                detections_file.write(json.dumps({
+                    "frame": frame_index,
+                    "time": round(frame_index / fps, 3),
+                    "detections": records
+                }) + "\n")
+                detection_count += len(records)
+
+                draw_results(frame, results, model.names, settings["task_type"], mask_renderer)
+                out.write(frame)
+                frame_index += 1
+    finally:
+        cap.release()
+        out.release()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "video": video_path,
+        "annotated_video": video_out_path,
+        "detections_file": detections_path,
+        "frames": frame_index,
+        "detections": detection_count,
+        "seconds": round(elapsed, 1),
+        "fps": round(frame_index / elapsed, 2) if elapsed > 0 else 0.0
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run YOLO detection over videos without the GUI")
+    parser.add_argument("--headless", action="store_true", help="Accepted for 'python Detect.py --headless'")
+    parser.add_argument("--model", required=True, help="Path to the YOLO model file (.pt)")
+    parser.add_argument("--class", dest="selected_class", type=int, required=True, help="Class ID to detect")
+    parser.add_argument("--input", required=True, help="Video file or directory of videos")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--conf", type=float, default=0.5, help="Confidence threshold (default: 0.5)")
+    parser.add_argument("--task", choices=["detection", "segmentation"], default="detection")
+    parser.add_argument("--tracker", choices=list(TRACKERS.keys()), default="ByteTrack")
+    parser.add_argument("--persist", action="store_true", help="Persist tracks between frames")
+    parser.add_argument("--device", default=None, help="cuda or cpu (default: auto)")
+    parser.add_argument("--backend", choices=list(BACKENDS.keys()), default="PyTorch",
+                        help="Inference backend, exports are cached under models/ (default: PyTorch)")
+    parser.add_argument("--decoder", choices=["auto"] + BACKEND_NAMES, default="auto",
+                        help="Frame source backend, auto benchmarks them on each video (default: auto)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Videos processed at the same time (default: number of CPU cores)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    videos = find_videos(args.input)
+    if not videos:
+        print(f"Error: No video files found in {args.input}")
+        return 1
+    os.makedirs(args.out, exist_ok=True)
+
+    cpu_count = os.cpu_count() or 1
+    workers = max(1, min(args.workers or cpu_count, len(videos)))
+    torch_threads = max(1, cpu_count // workers)
+    device = args.device or default_device()
+    settings = make_settings(args.conf, args.selected_class, args.task, TRACKERS[args.tracker], args.persist)
+
+    if BACKENDS[args.backend] is not None:
+        # Export once up front so the workers don't all try to export at the same time
+        export_model(args.model, BACKENDS[args.backend])
+
+    print(f"Processing {len(videos)} video(s) with {workers} worker(s) on {device.upper()} ({args.backend})")
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(args.model, device, args.backend, torch_threads)) as executor:
+        futures = {executor.submit(process_video, video, args.out, settings, args.decoder): video for video in videos}
+        for future in as_completed(futures):
+            video = futures[future]
+            try:
+                summary = future.result()
+                print(f"Done: {os.path.basename(video)} - {summary['frames']} frames, "
+                      f"{summary['detections']} detections, {summary['fps']} FPS")
+            except Exception as e:
+                failed += 1
+                print(f"Error processing {video}: {str(e)}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
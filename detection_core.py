@@ -0,0 +1,467 @@
+"""Model loading, inference and drawing shared by Detect.py and the headless runner.
+
+Nothing in this module may import PyQt6, it has to work on servers without a display.
+"""
+import hashlib
+import os
+import shutil
+import time
+
+import cv2
+import numpy as np
+import torch
+from ultralytics import YOLO
+from ultralytics.engine.results import Results
+
+
+# Available trackers (display name -> ultralytics tracker config)
+TRACKERS = {
+    "ByteTrack": "bytetrack.yaml",
+    "Bot-SORT": "botsort.yaml",
+    "None": None
+}
+
+VIDEO_EXTENSIONS = [".mp4", ".avi", ".mov", ".webm", ".mkv", ".flv", ".wmv"]
+
+# Inference backends (display name -> ultralytics export format, None runs the checkpoint in PyTorch)
+BACKENDS = {
+    "PyTorch": None,
+    "ONNX": "onnx",
+    "OpenVINO": "openvino",
+    "TorchScript": "torchscript"
+}
+
+DEFAULT_IMGSZ = 640
+
+
+def default_device():
+    """Pick CUDA when available, CPU otherwise"""
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Short SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def export_cache_path(model_path, export_format, imgsz, cache_dir):
+    """Where the export of a checkpoint is cached, keyed by its content hash and the image size"""
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    key = f"{stem}_{file_hash(model_path)}_{imgsz}"
+    if export_format == "openvino":
+        return os.path.join(cache_dir, f"{key}_openvino_model")
+    return os.path.join(cache_dir, f"{key}.{export_format}")
+
+
+def export_model(model_path, export_format, imgsz=DEFAULT_IMGSZ, cache_dir="models"):
+    """Export a checkpoint for a runtime backend on first use, returns the cached export path"""
+    cached_path = export_cache_path(model_path, export_format, imgsz, cache_dir)
+    if os.path.exists(cached_path):
+        return cached_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # ultralytics writes the export next to the checkpoint, move it into the cache
+    exported_path = YOLO(model_path).export(format=export_format, imgsz=imgsz)
+    shutil.move(str(exported_path), cached_path)
+    return cached_path
+
+
+def load_model(model_path, device, backend="PyTorch", imgsz=DEFAULT_IMGSZ, cache_dir="models"):
+    """Load a YOLO model for a backend, returns (model, is_segmentation_model).
+
+    PyTorch runs the checkpoint on the device, the other backends run a cached
+    export of it (exported on first use).
+    """
+    export_format = BACKENDS[backend]
+    if export_format is None:
+        model = YOLO(model_path).to(device)
+    else:
+        model = YOLO(export_model(model_path, export_format, imgsz, cache_dir))
+
+    # Check if model supports segmentation
+    is_segmentation_model = False
+    try:
+        # Try to get model task type (newer versions of ultralytics)
+        model_task = model.task
+        is_segmentation_model = model_task == 'segment'
+    except:
+        # Fallback for older versions - check model filename or architecture
+        if '-seg' in model_path.lower() or 'segment' in model_path.lower():
+            is_segmentation_model = True
+
+    return model, is_segmentation_model
+
+
+def measure_latency(model, imgsz=DEFAULT_IMGSZ, runs=5):
+    """Average milliseconds per predict call on a blank frame, after a warm-up call"""
+    frame = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    model.predict(frame, imgsz=imgsz, verbose=False)
+    start = time.perf_counter()
+    for _ in range(runs):
+        model.predict(frame, imgsz=imgsz, verbose=False)
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def make_settings(confidence, selected_class, task_type="detection", tracker_type=None, persist=False):
+    """Build the detection settings dict consumed by run_inference and the drawing code"""
+    return {
+        "confidence": confidence,
+        "selected_class": selected_class,
+        "task_type": task_type,
+        "tracker_type": tracker_type,
+        "persist": persist,
+    }
+
+
+def run_inference(model, frame, settings):
+    """Run the model on a frame (or a list of frames) using a snapshot of the detection settings"""
+    # Prepare tracking arguments if tracker is selected
+    tracker_args = None
+    if settings["tracker_type"] and settings["task_type"] == "detection":  # Tracking only for detection
+        tracker_args = {
+            "tracker": settings["tracker_type"],
+            "persist": settings["persist"]
+        }
+
+    return model.predict(
+        frame,
+        conf=settings["confidence"],
+        classes=[settings["selected_class"]],
+        **({"tracker": tracker_args} if tracker_args else {})
+    )
+
+
+class MotionGate:
+    """Skips inference while the scene is static.
+
+    Frames are compared on a small blurred grayscale copy against the frame the model
+    last ran on, so slow drift still adds up. The model only runs again once the share
+    of changed pixels passes a threshold set by the sensitivity (0 - 1).
+    """
+
+    def __init__(self, sensitivity=0.5, width=160, pixel_threshold=25, region_margin=0.1):
+        self.sensitivity = sensitivity
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.region_margin = region_margin
+        self.skipped = 0
+        self.total = 0
+        self._reference = None
+        self._scale = 1.0
+        self._frame_size = None
+
+    @property
+    def min_changed_ratio(self):
+        """Share of pixels that must change, from 5% at sensitivity 0 down to 0.05% at 1"""
+        return 0.05 * (1 - self.sensitivity) ** 2 + 0.0005
+
+    def small_gray(self, frame):
+        """Downscaled, blurred grayscale copy used for the comparison"""
+        h, w = frame.shape[:2]
+        self._scale = w / self.width
+        self._frame_size = (w, h)
+        small = cv2.resize(frame, (self.width, max(1, int(h / self._scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def check(self, small):
+        """Return (changed, region), region being the changed area as full-frame xyxy or None"""
+        self.total += 1
+        if self._reference is None or self._reference.shape != small.shape:
+            return True, None
+
+        changed = cv2.absdiff(self._reference, small) > self.pixel_threshold
+        if np.count_nonzero(changed) < self.min_changed_ratio * changed.size:
+            self.skipped += 1
+            return False, None
+
+        ys, xs = np.nonzero(changed)
+        frame_w, frame_h = self._frame_size
+        margin_x = self.region_margin * frame_w
+        margin_y = self.region_margin * frame_h
+        region = (
+            int(max(xs.min() * self._scale - margin_x, 0)),
+            int(max(ys.min() * self._scale - margin_y, 0)),
+            int(min((xs.max() + 1) * self._scale + margin_x, frame_w)),
+            int(min((ys.max() + 1) * self._scale + margin_y, frame_h)),
+        )
+        return True, region
+
+    def accept(self, small):
+        """Make this frame the reference after the model ran on it"""
+        self._reference = small
+
+
+def merge_region_results(frame, previous, region_results, region):
+    """Combine detections from a crop of the changed region with the previous ones outside it"""
+    if not region_results:
+        return previous
+    x1, y1, _, _ = region
+    new_result = region_results[0]
+    data = new_result.boxes.data.clone()
+    data[:, [0, 2]] += x1
+    data[:, [1, 3]] += y1
+
+    if previous and previous[0].boxes is not None and len(previous[0].boxes):
+        old = previous[0].boxes.data.to(data.device)
+        if old.shape[1] == data.shape[1]:
+            # Keep earlier boxes whose centre lies outside the re-detected region
+            cx = (old[:, 0] + old[:, 2]) / 2
+            cy = (old[:, 1] + old[:, 3]) / 2
+            rx1, ry1, rx2, ry2 = region
+            outside = (cx < rx1) | (cx > rx2) | (cy < ry1) | (cy > ry2)
+            data = torch.cat([old[outside], data])
+
+    return [Results(frame, path=new_result.path, names=new_result.names, boxes=data)]
+
+
+class BoxPropagator:
+    """Moves the last detections forward on frames where the model is skipped.
+
+    Corner features inside the boxes are tracked with sparse Lucas-Kanade optical
+    flow on a downscaled grayscale copy, and every box is shifted by the median
+    motion of its points.
+    """
+
+    def __init__(self, scale=0.5, max_points=300):
+        self.scale = scale
+        self.max_points = max_points
+        self._prev_gray = None
+        self._result = None
+        self._boxes = None
+
+    def to_gray(self, frame):
+        """Downscaled grayscale copy used for the flow, take it before the frame is drawn on"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+
+    def reset(self, gray, results):
+        """Start propagating from a keyframe and its results"""
+        self._prev_gray = gray
+        self._result = results[0] if results else None
+        if self._result is not None and self._result.boxes is not None and len(self._result.boxes):
+            self._boxes = self._result.boxes.xyxy.cpu().numpy().astype(np.float32)
+        else:
+            self._boxes = None
+
+    def propagate(self, gray):
+        """Return (results for this frame, median motion in full-resolution pixels)"""
+        if self._result is None:
+            return [], 0.0
+        if self._boxes is None:
+            self._prev_gray = gray
+            return [self._result], 0.0
+
+        # Look for features only inside the boxes
+        mask = np.zeros_like(self._prev_gray)
+        for x1, y1, x2, y2 in (self._boxes * self.scale).astype(int).tolist():
+            mask[max(y1, 0):max(y2, 0), max(x1, 0):max(x2, 0)] = 255
+        points = cv2.goodFeaturesToTrack(self._prev_gray, self.max_points, 0.01, 5, mask=mask)
+
+        motion = 0.0
+        if points is not None:
+            next_points, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, points, None,
+                                                              winSize=(15, 15), maxLevel=2)
+            good = status.reshape(-1) == 1
+            start = points.reshape(-1, 2)[good] / self.scale
+            flow = next_points.reshape(-1, 2)[good] / self.scale - start
+            if len(flow):
+                motion = float(np.median(np.linalg.norm(flow, axis=1)))
+
+                # Points x boxes membership, then the median shift of each box's points
+                boxes = self._boxes
+                inside = ((start[None, :, 0] >= boxes[:, None, 0]) & (start[None, :, 0] <= boxes[:, None, 2]) &
+                          (start[None, :, 1] >= boxes[:, None, 1]) & (start[None, :, 1] <= boxes[:, None, 3]))
+                for i in range(len(boxes)):
+                    if inside[i].sum() >= 3:
+                        dx, dy = np.median(flow[inside[i]], axis=0)
+                        boxes[i] += (dx, dy, dx, dy)
+
+        self._prev_gray = gray
+        data = self._result.boxes.data.clone()
+        data[:, :4] = torch.as_tensor(self._boxes, dtype=data.dtype, device=data.device)
+        propagated = self._result.new()
+        propagated.update(boxes=data)
+        return [propagated], motion
+
+
+class StrideController:
+    """Chooses how many frames pass between keyframes.
+
+    The stride is the smallest one whose average cost per frame (one inference
+    plus stride - 1 propagations) meets the target FPS, and it is cut back when
+    objects move fast so propagated boxes don't drift too far from the truth.
+    """
+
+    def __init__(self, target_fps, max_stride=10, motion_limit=24.0, smoothing=0.2):
+        self.target_fps = target_fps
+        self.max_stride = max_stride
+        self.motion_limit = motion_limit  # Pixels boxes may move between keyframes
+        self.smoothing = smoothing
+        self.inference_time = None
+        self.propagation_time = None
+        self.motion = 0.0
+        self.stride = 1
+
+    def _average(self, current, value):
+        return value if current is None else current + self.smoothing * (value - current)
+
+    def add_inference(self, seconds):
+        self.inference_time = self._average(self.inference_time, seconds)
+        return self._update()
+
+    def add_propagation(self, seconds, motion):
+        self.propagation_time = self._average(self.propagation_time, seconds)
+        self.motion = self._average(self.motion, motion)
+        return self._update()
+
+    def _update(self):
+        if self.inference_time is None:
+            return self.stride
+        budget = 1.0 / self.target_fps
+        propagation = self.propagation_time or 0.0
+        if self.inference_time <= budget:
+            stride = 1
+        elif propagation >= budget:
+            stride = self.max_stride
+        else:
+            stride = int(np.ceil((self.inference_time - propagation) / (budget - propagation)))
+        if self.motion > 0:
+            stride = min(stride, max(1, int(self.motion_limit / self.motion)))
+        self.stride = int(np.clip(stride, 1, self.max_stride))
+        return self.stride
+
+
+def draw_detections(frame, results, names):
+    """Draw bounding boxes, labels and track IDs onto the frame"""
+    for r in results:
+        for box in r.boxes:
+            cls_id = int(box.cls[0])
+            conf = float(box.conf[0])
+            x1, y1, x2, y2 = map(int, box.xyxy[0])
+            track_id = int(box.id[0]) if box.id is not None else None
+
+            label = f"{names[cls_id]} {conf:.2f}"
+            if track_id is not None:
+                label += f" ID:{track_id}"
+
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(frame, label, (x1, y1 - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+
+class MaskRenderer:
+    """Composites all instance masks of a frame in a single blend.
+
+    Instead of resizing every mask to full frame size and blending the whole frame
+    once per instance, the masks are merged at model resolution, upscaled only
+    inside each instance's bounding box and blended once over the area they cover.
+    Frame-sized buffers are kept between calls, so the cost stays close to flat
+    as the number of instances grows.
+    """
+
+    def __init__(self, color=(0, 255, 0), alpha=0.3, threshold=0.5):
+        self.color = color
+        self.alpha = alpha
+        self.threshold = threshold
+        self._shape = None
+        self._coverage = None  # Full-frame mask buffer
+        self._overlay = None   # Full-frame solid colour buffer
+        self._blend = None     # Full-frame blend output buffer
+
+    def _ensure_buffers(self, frame):
+        if self._shape != frame.shape:
+            self._shape = frame.shape
+            self._coverage = np.zeros(frame.shape[:2], dtype=np.uint8)
+            self._overlay = np.empty_like(frame)
+            self._overlay[:] = self.color
+            self._blend = np.empty_like(frame)
+
+    def render(self, frame, masks, boxes):
+        """Blend masks (N x mh x mw, model resolution) into the frame in place.
+
+        boxes are the matching N x 4 xyxy boxes in frame coordinates.
+        """
+        if len(masks) == 0:
+            return
+        self._ensure_buffers(frame)
+        frame_h, frame_w = frame.shape[:2]
+        mask_h, mask_w = masks.shape[1:]
+
+        # Merge every instance into one map at model resolution
+        merged = masks.max(axis=0).astype(np.float32)
+
+        # Masks are in the letterboxed model input, map frame coordinates onto it
+        gain = min(mask_h / frame_h, mask_w / frame_w)
+        pad_x = (mask_w - frame_w * gain) / 2
+        pad_y = (mask_h - frame_h * gain) / 2
+
+        coverage = self._coverage
+        roi_x1, roi_y1, roi_x2, roi_y2 = frame_w, frame_h, 0, 0
+        boxes = np.clip(np.round(boxes).astype(int), 0, [frame_w, frame_h, frame_w, frame_h])
+        for x1, y1, x2, y2 in boxes.tolist():
+            if x2 <= x1 or y2 <= y1:
+                continue
+            mx1 = max(int(x1 * gain + pad_x), 0)
+            my1 = max(int(y1 * gain + pad_y), 0)
+            mx2 = min(int(np.ceil(x2 * gain + pad_x)), mask_w)
+            my2 = min(int(np.ceil(y2 * gain + pad_y)), mask_h)
+            if mx2 <= mx1 or my2 <= my1:
+                continue
+
+            # Upscale only the part of the merged map inside this box
+            crop = cv2.resize(merged[my1:my2, mx1:mx2], (x2 - x1, y2 - y1))
+            np.maximum(coverage[y1:y2, x1:x2], crop > self.threshold, out=coverage[y1:y2, x1:x2])
+            roi_x1, roi_y1 = min(roi_x1, x1), min(roi_y1, y1)
+            roi_x2, roi_y2 = max(roi_x2, x2), max(roi_y2, y2)
+
+        if roi_x2 <= roi_x1 or roi_y2 <= roi_y1:
+            return
+
+        # One blend over the region covered by all instances
+        roi = (slice(roi_y1, roi_y2), slice(roi_x1, roi_x2))
+        cv2.addWeighted(frame[roi], 1 - self.alpha, self._overlay[roi], self.alpha, 0, dst=self._blend[roi])
+        np.copyto(frame[roi], self._blend[roi], where=coverage[roi].view(bool)[..., None])
+        coverage[roi] = 0
+
+
+def draw_segmentation(frame, results, names, mask_renderer=None):
+    """Draw segmentation masks onto the frame"""
+    if mask_renderer is None:
+        mask_renderer = MaskRenderer()
+    for r in results:
+        # Draw segmentation masks if available
+        if hasattr(r, 'masks') and r.masks is not None:
+            masks = r.masks.data.cpu().numpy()
+            boxes = r.boxes.xyxy.cpu().numpy()
+            mask_renderer.render(frame, masks, boxes)
+
+
+def draw_results(frame, results, names, task_type, mask_renderer=None):
+    """Draw results for the given task type onto the frame"""
+    if task_type == "detection":
+        draw_detections(frame, results, names)
+    elif task_type == "segmentation":
+        draw_segmentation(frame, results, names, mask_renderer)
+
+
+def results_to_records(results, names):
+    """Convert results into plain dicts that can be written as JSON"""
+    records = []
+    for r in results:
+        if r.boxes is None:
+            continue
+        for box in r.boxes:
+            cls_id = int(box.cls[0])
+            records.append({
+                "class_id": cls_id,
+                "class_name": names[cls_id],
+                "confidence": round(float(box.conf[0]), 4),
+                "box": [round(float(v), 1) for v in box.xyxy[0]],
+                "track_id": int(box.id[0]) if box.id is not None else None,
+            })
+    return records
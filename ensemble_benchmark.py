@@ -0,0 +1,304 @@
+"""Accuracy vs throughput benchmark for the ensemble.
+
+Runs every member once over a labelled image folder or a labelled clip, timing
+each model per frame, then scores every strategy on every subset of the members
+from the cached predictions:
+
+    python ensemble_benchmark.py --images dataset/val
+    python ensemble_benchmark.py --video clip.mp4 --labels clip_labels/
+
+Labels are YOLO .txt files (class cx cy w h, normalized). Images are matched to
+the .txt with the same stem, next to the image or in a sibling labels/ folder;
+for a clip, frame i is labelled by frame_{i:06d}.txt as written by the frame
+extraction tools. Frames without a label file are skipped.
+
+The cost of a subset is the sum of its members' measured times plus fusion: on a
+CPU the members share the same cores, so running them side by side doesn't make
+the total work smaller.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from ensemble_engine import STRATEGIES, Ensemble
+from ensemble_fusion import box_iou
+from ensemble_learnig_stak import model_paths
+from frame_source import open_source
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+# --------------------------- DATASET ---------------------------
+def read_yolo_labels(label_path, width, height):
+    """Ground truth boxes (xyxy pixels) and classes from a YOLO label file"""
+    rows = np.loadtxt(label_path, ndmin=2) if os.path.getsize(label_path) else np.zeros((0, 5))
+    classes = rows[:, 0].astype(int)
+    cx, cy, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1).astype(np.float32)
+    return boxes, classes
+
+
+def image_label_path(image_path):
+    stem, _ = os.path.splitext(image_path)
+    label_path = stem + ".txt"
+    if os.path.exists(label_path):
+        return label_path
+    # images/x.jpg -> labels/x.txt
+    folder, name = os.path.split(stem)
+    label_path = os.path.join(os.path.dirname(folder), "labels", name + ".txt")
+    return label_path if os.path.exists(label_path) else None
+
+
+def iter_labelled_images(folder):
+    """Yield (frame index, image, ground truth) for each labelled image in the folder"""
+    names = sorted(n for n in os.listdir(folder) if os.path.splitext(n)[1].lower() in IMAGE_EXTENSIONS)
+    for frame_index, name in enumerate(names):
+        image_path = os.path.join(folder, name)
+        label_path = image_label_path(image_path)
+        if label_path is None:
+            continue
+        image = cv2.imread(image_path)
+        if image is None:
+            continue
+        yield frame_index, image, read_yolo_labels(label_path, image.shape[1], image.shape[0])
+
+
+def iter_labelled_clip(video_path, labels_dir):
+    """Yield (frame index, frame, ground truth) for each labelled frame of the clip"""
+    cap = open_source(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file: {video_path}")
+    frame_index = 0
+    try:
+        while True:
+            label_path = os.path.join(labels_dir, f"frame_{frame_index:06d}.txt")
+            if not os.path.exists(label_path):
+                # Unlabelled frame, skip decoding it
+                if not cap.grab():
+                    break
+                frame_index += 1
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame_index, frame, read_yolo_labels(label_path, frame.shape[1], frame.shape[0])
+            frame_index += 1
+    finally:
+        cap.release()
+
+
+# --------------------------- METRICS ---------------------------
+def average_precision(recall, precision):
+    """All-point interpolated area under the precision/recall curve"""
+    recall = np.concatenate([[0.0], recall, [1.0]])
+    precision = np.concatenate([[0.0], precision, [0.0]])
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    changes = np.where(recall[1:] != recall[:-1])[0]
+    return float(np.sum((recall[changes + 1] - recall[changes]) * precision[changes + 1]))
+
+
+def evaluate(detections, ground_truth, iou_threshold=0.5):
+    """mAP and recall at iou_threshold.
+
+    detections is {frame: (boxes, scores, classes)}, ground_truth {frame: (boxes, classes)}.
+    Returns (mAP over the classes in the ground truth, overall recall).
+    """
+    scores_by_class, hits_by_class, gt_count = {}, {}, {}
+    for frame_index, (gt_boxes, gt_classes) in ground_truth.items():
+        for cls in gt_classes.tolist():
+            gt_count[cls] = gt_count.get(cls, 0) + 1
+        boxes, scores, classes = detections.get(frame_index, (np.zeros((0, 4)), np.zeros(0), np.zeros(0)))
+        for cls in np.unique(classes).tolist():
+            det_mask = classes == cls
+            gt_mask = gt_classes == cls
+            order = np.argsort(-scores[det_mask])
+            det_scores = scores[det_mask][order]
+            hits = np.zeros(len(order), dtype=bool)
+            if gt_mask.any():
+                iou = box_iou(boxes[det_mask][order], gt_boxes[gt_mask])
+                matched = np.zeros(iou.shape[1], dtype=bool)
+                for i in range(len(order)):
+                    candidates = np.where(~matched & (iou[i] >= iou_threshold))[0]
+                    if len(candidates):
+                        best = candidates[np.argmax(iou[i, candidates])]
+                        matched[best] = True
+                        hits[i] = True
+            scores_by_class.setdefault(cls, []).append(det_scores)
+            hits_by_class.setdefault(cls, []).append(hits)
+
+    aps, true_positives = [], 0
+    for cls, count in gt_count.items():
+        if cls not in scores_by_class:
+            aps.append(0.0)
+            continue
+        scores = np.concatenate(scores_by_class[cls])
+        hits = np.concatenate(hits_by_class[cls])[np.argsort(-scores, kind="stable")]
+        tp = np.cumsum(hits)
+        fp = np.cumsum(~hits)
+        aps.append(average_precision(tp / count, tp / np.maximum(tp + fp, 1)))
+        true_positives += int(hits.sum())
+    total = sum(gt_count.values())
+    return (float(np.mean(aps)) if aps else 0.0), (true_positives / total if total else 0.0)
+
+
+def pareto_front(rows):
+    """Rows not beaten by another row that is both at least as fast and at least as accurate"""
+    front = []
+    best_map = -1.0
+    for row in sorted(rows, key=lambda r: (-r["fps"], -r["mAP50"])):
+        if row["mAP50"] > best_map:
+            front.append(row)
+            best_map = row["mAP50"]
+    return front
+
+
+# --------------------------- BENCHMARK ---------------------------
+def run_members(ensemble, samples, cache_dir):
+    """Run every member on every sample, returns the ground truth and per-model seconds per frame.
+
+    Timings are kept next to the prediction cache so a rerun only re-scores.
+    """
+    timing_path = os.path.join(cache_dir, "timings.json") if cache_dir else None
+    timings = {}
+    if timing_path and os.path.exists(timing_path):
+        with open(timing_path) as f:
+            timings = {int(k): v for k, v in json.load(f).items()}
+
+    ground_truth = {}
+    models = None
+    for frame_index, frame, gt in samples:
+        ground_truth[frame_index] = gt
+        frame_times = timings.get(frame_index, [None] * len(ensemble.model_paths))
+        for i in range(len(ensemble.model_paths)):
+            if ensemble.cache.get(frame_index, i) is not None and frame_times[i] is not None:
+                continue
+            if models is None:
+                models = ensemble.models
+                # One model at a time on all cores, so each time is that model's alone
+                torch.set_num_threads(os.cpu_count() or 1)
+            start = time.perf_counter()
+            prediction = ensemble.predict_member(models[i], frame)
+            frame_times[i] = time.perf_counter() - start
+            ensemble.cache.put(frame_index, i, prediction)
+        timings[frame_index] = frame_times
+        if len(ground_truth) % 50 == 0:
+            print(f"Ran the models on {len(ground_truth)} frames")
+
+    ensemble.cache.flush()
+    if timing_path:
+        with open(timing_path, "w") as f:
+            json.dump(timings, f)
+    return ground_truth, timings
+
+
+def score_configuration(ensemble, members, strategy, ground_truth, timings):
+    """Accuracy and cost of one strategy on one subset of the members"""
+    full_weights = STRATEGIES[strategy]
+    weights = None if full_weights is None else [full_weights[i] for i in members]
+    sub = Ensemble([ensemble.model_paths[i] for i in members], strategy=strategy, weights=weights,
+                   fusion_method=ensemble.fusion_method, iou_threshold=ensemble.iou_threshold,
+                   score_threshold=ensemble.score_threshold, cascade_band=ensemble.cascade_band)
+
+    detections, latencies = {}, []
+    for frame_index in ground_truth:
+        predictions = [ensemble.cache.get(frame_index, i) for i in members]
+        start = time.perf_counter()
+        if strategy == "cascade":
+            detections[frame_index] = sub.run_cascade(lambda stage: [predictions[i] for i in stage])
+            ran = sub.last_members_run
+        else:
+            detections[frame_index] = sub.fuse(predictions)
+            ran = range(len(members))
+        fusion_time = time.perf_counter() - start
+        latencies.append(sum(timings[frame_index][members[i]] for i in ran) + fusion_time)
+
+    map50, recall = evaluate(detections, ground_truth)
+    latencies = np.array(latencies)
+    return {
+        "strategy": strategy,
+        "models": " ".join(str(i) for i in members),
+        "mAP50": map50,
+        "recall": recall,
+        "fps": 1.0 / max(latencies.mean(), 1e-9),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ensemble strategies and model subsets")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--images", help="Folder of images with YOLO label files")
+    source.add_argument("--video", help="Labelled clip, requires --labels")
+    parser.add_argument("--labels", help="Folder of frame_NNNNNN.txt YOLO labels for --video")
+    parser.add_argument("--models", nargs="+", default=model_paths, help="Member model files")
+    parser.add_argument("--fusion", choices=["wbf", "nms"], default="wbf")
+    parser.add_argument("--cache-dir", default=None, help="Reuse predictions and timings from an earlier run")
+    parser.add_argument("--target-map", type=float, default=None,
+                        help="Report the fastest configuration with at least this mAP50")
+    parser.add_argument("--csv", default=None, help="Also write every configuration to this CSV file")
+    args = parser.parse_args(argv)
+    if args.video and not args.labels:
+        parser.error("--video requires --labels")
+    return args
+
+
+def print_rows(title, rows):
+    print(f"\n{title}")
+    print(f"{'strategy':<10} {'models':<11} {'mAP50':>6} {'recall':>6} {'FPS':>7} {'p95 ms':>8}")
+    for row in rows:
+        print(f"{row['strategy']:<10} {row['models']:<11} {row['mAP50']:>6.3f} {row['recall']:>6.3f} "
+              f"{row['fps']:>7.2f} {row['p95_ms']:>8.1f}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    ensemble = Ensemble(args.models, cache_dir=args.cache_dir, fusion_method=args.fusion,
+                        source=args.images or args.video)
+    samples = iter_labelled_images(args.images) if args.images else iter_labelled_clip(args.video, args.labels)
+    ground_truth, timings = run_members(ensemble, samples, args.cache_dir)
+    if not ground_truth:
+        print("Error: No labelled frames found")
+        return 1
+
+    num_models = len(args.models)
+    rows = []
+    for size in range(1, num_models + 1):
+        for members in itertools.combinations(range(num_models), size):
+            for strategy, weights in STRATEGIES.items():
+                # The strategies only differ in their weights or staging once there are several members
+                if size == 1 and strategy != "bagging":
+                    continue
+                if weights is not None and len(weights) != num_models:
+                    continue
+                rows.append(score_configuration(ensemble, list(members), strategy, ground_truth, timings))
+
+    rows.sort(key=lambda r: -r["mAP50"])
+    print(f"Scored {len(rows)} configurations on {len(ground_truth)} labelled frames")
+    print_rows("All configurations", rows)
+    print_rows("Pareto front (no other configuration is both faster and more accurate)", pareto_front(rows))
+
+    if args.target_map is not None:
+        meeting = [r for r in rows if r["mAP50"] >= args.target_map]
+        if meeting:
+            print_rows(f"Fastest configuration with mAP50 >= {args.target_map}", [max(meeting, key=lambda r: r["fps"])])
+        else:
+            print(f"\nNo configuration reaches mAP50 {args.target_map}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
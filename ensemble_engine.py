@@ -0,0 +1,407 @@
+"""Ensemble engine shared by the ensemble script and tools.
+
+Runs every member once per frame and keeps the raw per-model predictions, in
+memory and optionally on disk, by frame index. Switching strategy or weights is
+then only a re-fusion over the cached predictions, no model is run again.
+
+The cascade strategy runs the members in stages, cheapest first, and stops as
+soon as the fused detections are confident.
+
+Members run on the frame separately, on one shared preprocessed tensor per input
+size ("shared"), or as one combined ONNX graph per input size ("graph").
+
+For video, the round-robin schedule runs only a few members per frame in rotation
+and fills in the others with their recent predictions, matched to the fresh boxes.
+"""
+import glob
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from ultralytics import YOLO
+
+from ensemble_fusion import box_iou, fuse
+from ensemble_graph import CombinedGraph, letterbox, member_imgsz, predict_from_tensor
+
+# Per-model score weights of each strategy, None is an equal vote
+STRATEGIES = {
+    "stacking": [0.9, 0.9, 0.9, 0.9, 1.2],  # Favor the best model
+    "bagging": None,
+    "boosting": [0.7, 0.9, 1.0, 1.1, 1.3],  # Later models weigh more
+    "cascade": None,  # Equal vote between the members that ran
+}
+
+EXECUTION_MODES = ["separate", "shared", "graph"]
+SCHEDULES = ["all", "round_robin"]
+
+
+def member_worker_count(num_models):
+    """One thread per model, but never more threads than CPU cores"""
+    return max(1, min(num_models, os.cpu_count() or 1))
+
+
+def align_prediction(prediction, reference, age, decay=0.9, iou_threshold=0.3):
+    """Bring a member's prediction from age frames ago onto the current frame.
+
+    Boxes overlapping a same-class box of the fresh reference prediction take its
+    position, the member then votes for that object; the others keep their old
+    position. Scores fade by decay per frame of age.
+    """
+    boxes, scores, classes = prediction
+    reference_boxes, _, reference_classes = reference
+    scores = scores * decay ** age
+    if len(boxes) and len(reference_boxes):
+        iou = box_iou(boxes, reference_boxes)
+        iou[classes[:, None] != reference_classes[None, :]] = 0
+        best = iou.argmax(axis=1)
+        matched = iou[np.arange(len(boxes)), best] >= iou_threshold
+        boxes = boxes.copy()
+        boxes[matched] = reference_boxes[best[matched]]
+    return boxes, scores, classes
+
+
+def source_identity(source):
+    """What predictions were made from: the path, with size and modification time for files and folders"""
+    if source is None:
+        return None
+    path = os.path.abspath(str(source))
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return {"path": path, "size": stat.st_size, "mtime": stat.st_mtime}
+    if os.path.isdir(path):
+        entries = sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime)
+                         for entry in os.scandir(path) if entry.is_file())
+        digest = hashlib.sha256(json.dumps(entries).encode()).hexdigest()[:16]
+        return {"path": path, "files": len(entries), "digest": digest}
+    return {"path": str(source)}  # Streams and cameras
+
+
+class PredictionCache:
+    """Raw predictions by frame index and model index, optionally persisted to a directory.
+
+    On disk the predictions are written in chunks of chunk_size frames, next to a
+    meta.json naming the models, the source and the execution mode they come from.
+    A cache directory made from anything else is refused.
+    """
+
+    def __init__(self, cache_dir=None, model_paths=None, chunk_size=1000, source=None, execution=None):
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+        self.source = source_identity(source)
+        self.execution = execution
+        self._frames = {}  # frame index -> {model index: (boxes, scores, classes)}
+        self._pending = set()  # Frames not written to disk yet
+        self._chunk_count = 0
+        if cache_dir:
+            self._open(model_paths)
+
+    def _open(self, model_paths):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        meta_path = os.path.join(self.cache_dir, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            cached_models = meta["models"]
+            if model_paths is not None and cached_models != list(model_paths):
+                raise ValueError(f"Cache {self.cache_dir} was made with different models: {cached_models}")
+            if self.source is not None and meta.get("source") != self.source:
+                raise ValueError(f"Cache {self.cache_dir} was made from a different source: {meta.get('source')}, "
+                                 f"use another --cache-dir or delete it")
+            if self.execution is not None and meta.get("execution") != self.execution:
+                raise ValueError(f"Cache {self.cache_dir} was made with execution mode {meta.get('execution')}")
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"models": list(model_paths or []), "source": self.source, "execution": self.execution},
+                          f, indent=2)
+        chunk_paths = sorted(glob.glob(os.path.join(self.cache_dir, "chunk_*.npz")))
+        for chunk_path in chunk_paths:
+            self._load_chunk(chunk_path)
+        self._chunk_count = len(chunk_paths)
+
+    def _load_chunk(self, chunk_path):
+        # Every lookup on an NpzFile reads the array again, so each one is read once per chunk
+        with np.load(chunk_path) as data:
+            frames, models, counts = data["frames"].tolist(), data["models"].tolist(), data["counts"]
+            boxes, scores, classes = data["boxes"], data["scores"], data["classes"]
+        splits = np.cumsum(counts)[:-1]
+        rows = zip(np.split(boxes, splits), np.split(scores, splits), np.split(classes, splits))
+        for frame_index, model_index, prediction in zip(frames, models, rows):
+            self._frames.setdefault(frame_index, {})[model_index] = prediction
+
+    def __len__(self):
+        return len(self._frames)
+
+    def frames(self):
+        return sorted(self._frames)
+
+    def get(self, frame_index, model_index):
+        """The cached prediction, or None if that model hasn't run on the frame"""
+        return self._frames.get(frame_index, {}).get(model_index)
+
+    def put(self, frame_index, model_index, prediction):
+        self._frames.setdefault(frame_index, {})[model_index] = prediction
+        if self.cache_dir:
+            self._pending.add(frame_index)
+            if len(self._pending) >= self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        """Write the frames added since the last flush as a new chunk"""
+        if not self.cache_dir or not self._pending:
+            return
+        frames, models, counts, boxes, scores, classes = [], [], [], [], [], []
+        for frame_index in sorted(self._pending):
+            for model_index, (b, s, c) in self._frames[frame_index].items():
+                frames.append(frame_index)
+                models.append(model_index)
+                counts.append(len(b))
+                boxes.append(b)
+                scores.append(s)
+                classes.append(c)
+        chunk_path = os.path.join(self.cache_dir, f"chunk_{self._chunk_count:05d}.npz")
+        np.savez(chunk_path, frames=np.array(frames), models=np.array(models), counts=np.array(counts),
+                 boxes=np.concatenate(boxes).reshape(-1, 4), scores=np.concatenate(scores),
+                 classes=np.concatenate(classes))
+        self._pending.clear()
+        self._chunk_count += 1
+
+
+class Ensemble:
+    """Runs the member models concurrently, caches their predictions and fuses them.
+
+    Models are loaded on first use, so re-fusing a disk cache doesn't load any.
+    """
+
+    def __init__(self, model_paths, cache_dir=None, strategy="bagging", weights=None, fusion_method="wbf",
+                 iou_threshold=0.5, score_threshold=0.3, cascade_stages=None, cascade_band=(0.3, 0.7),
+                 execution="separate", schedule="all", members_per_frame=1, temporal_window=5, source=None):
+        if schedule == "round_robin" and strategy == "cascade":
+            raise ValueError("The cascade picks its own members, it can't use round-robin scheduling")
+        self.model_paths = list(model_paths)
+        # source is the video or image folder the cached predictions belong to
+        self.cache = PredictionCache(cache_dir, self.model_paths, source=source, execution=execution)
+        self.strategy = strategy
+        self.weights = weights  # Overrides the strategy's weights
+        self.fusion_method = fusion_method
+        self.iou_threshold = iou_threshold
+        self.score_threshold = score_threshold
+        # Model indices run by each cascade stage, by default the first model alone and then the rest
+        self.cascade_stages = cascade_stages or [[0], list(range(1, len(self.model_paths)))]
+        self.cascade_band = cascade_band  # Scores in [low, high) are ambiguous and escalate
+        self.stage_counts = [0] * len(self.cascade_stages)  # Frames each cascade stage ran on
+        self.last_members_run = []  # Members the last cascade call needed
+        self.execution = execution
+        self.schedule = schedule
+        self.members_per_frame = members_per_frame  # Members run per frame by the round-robin schedule
+        self.temporal_window = temporal_window  # Frames a member's last prediction stays usable
+        self._recent = {}  # member index -> (frame index, prediction) of its last run
+        self._models = None
+        self._executor = None
+        self._graphs = None  # (member indices, CombinedGraph) per input size
+
+    @property
+    def models(self):
+        if self._models is None:
+            self._models = [YOLO(path) for path in self.model_paths]
+            workers = member_worker_count(len(self._models))
+            # Split the cores between the concurrent forward passes instead of each one using all of them
+            torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ensemble")
+        return self._models
+
+    def member_groups(self):
+        """Member indices grouped by input size, {(height, width): [indices]}"""
+        groups = {}
+        for i, model in enumerate(self.models):
+            groups.setdefault(member_imgsz(model), []).append(i)
+        return groups
+
+    @property
+    def graphs(self):
+        if self._graphs is None:
+            self._graphs = {size: (members, CombinedGraph([self.model_paths[i] for i in members], size))
+                            for size, members in self.member_groups().items()}
+        return self._graphs
+
+    def run_members(self, frame, members):
+        """Run the members on the frame with the current execution mode, returns {index: prediction}.
+
+        The graph mode runs whole groups, so it can return more members than asked for.
+        """
+        if self.execution == "graph":
+            predictions = {}
+            for size, (group, graph) in self.graphs.items():
+                if any(i in members for i in group):
+                    group_predictions = graph.predict(letterbox(frame, size), frame.shape)
+                    predictions.update(zip(group, group_predictions))
+            return predictions
+
+        models = self.models
+        if self.execution == "shared":
+            # One letterbox/normalize/tensor conversion per input size instead of one per member
+            shared_inputs = {}
+            futures = {}
+            for i in members:
+                size = member_imgsz(models[i])
+                if size not in shared_inputs:
+                    shared_inputs[size] = letterbox(frame, size)
+                futures[i] = self._executor.submit(predict_from_tensor, models[i], shared_inputs[size], frame.shape)
+        else:
+            futures = {i: self._executor.submit(self.predict_member, models[i], frame) for i in members}
+        return {i: future.result() for i, future in futures.items()}
+
+    def close(self):
+        self.cache.flush()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def strategy_weights(self, strategy=None, weights=None):
+        """The per-model weights to fuse with, an explicit weights list wins over the strategy"""
+        weights = weights if weights is not None else self.weights
+        if weights is None:
+            weights = STRATEGIES[strategy or self.strategy]
+        if weights is not None and len(weights) != len(self.model_paths):
+            raise ValueError(f"Expected {len(self.model_paths)} weights, got {len(weights)}")
+        return weights
+
+    @staticmethod
+    def predict_member(model, frame):
+        """Run one model, returns its boxes, confidences and class ids as arrays"""
+        result = model(frame, verbose=False)[0]
+        return (result.boxes.xyxy.cpu().numpy(), result.boxes.conf.cpu().numpy(),
+                result.boxes.cls.cpu().numpy().astype(int))
+
+    def predict(self, frame_index, frame, members=None):
+        """Per-model predictions for the frame, running only the members not cached yet.
+
+        members limits which models are needed (all by default); PyTorch releases the
+        GIL during inference, so the frame costs about as much as the slowest member.
+        """
+        members = range(len(self.model_paths)) if members is None else members
+        missing = [i for i in members if self.cache.get(frame_index, i) is None]
+        if missing:
+            for i, prediction in self.run_members(frame, missing).items():
+                if self.cache.get(frame_index, i) is None:
+                    self.cache.put(frame_index, i, prediction)
+        return [self.cache.get(frame_index, i) for i in members]
+
+    def fuse(self, predictions, strategy=None, weights=None):
+        """Fuse per-model predictions into boxes, scores and classes"""
+        return fuse(predictions, self.strategy_weights(strategy, weights), self.fusion_method,
+                    self.iou_threshold, self.score_threshold)
+
+    def detect(self, frame_index, frame):
+        """Run (or reuse) the members on the frame and fuse them with the current strategy"""
+        if self.strategy == "cascade":
+            return self.run_cascade(lambda members: self.predict(frame_index, frame, members))
+        if self.schedule == "round_robin":
+            return self.fuse(self.predict_round_robin(frame_index, frame))
+        return self.fuse(self.predict(frame_index, frame))
+
+    def scheduled_members(self, frame_index):
+        """The members the round-robin schedule runs on this frame"""
+        num_models = len(self.model_paths)
+        count = min(self.members_per_frame, num_models)
+        return sorted({(frame_index * count + j) % num_models for j in range(count)})
+
+    def predict_round_robin(self, frame_index, frame):
+        """Run the scheduled members, fill in the others from their recent runs.
+
+        Frames must come in order. Members with nothing recent enough contribute
+        an empty prediction.
+        """
+        if any(last_frame > frame_index for last_frame, _ in self._recent.values()):
+            self._recent = {}  # Seeked back, the old predictions don't belong to this scene
+        members = self.scheduled_members(frame_index)
+        fresh = dict(zip(members, self.predict(frame_index, frame, members)))
+        for i, prediction in fresh.items():
+            self._recent[i] = (frame_index, prediction)
+
+        reference = [np.concatenate(x) for x in zip(*fresh.values())]
+        predictions = []
+        for i in range(len(self.model_paths)):
+            if i in fresh:
+                predictions.append(fresh[i])
+                continue
+            last_frame, prediction = self._recent.get(i, (None, None))
+            if last_frame is None or frame_index - last_frame > self.temporal_window:
+                predictions.append((np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32),
+                                    np.zeros(0, dtype=int)))
+                continue
+            predictions.append(align_prediction(prediction, reference, frame_index - last_frame))
+        return predictions
+
+    def is_uncertain(self, boxes, scores, classes):
+        """True if any score is in the ambiguous band or boxes of different classes overlap"""
+        low, high = self.cascade_band
+        if np.any((scores >= low) & (scores < high)):
+            return True
+        if len(boxes) < 2:
+            return False
+        conflicts = (box_iou(boxes, boxes) > self.iou_threshold) & (classes[:, None] != classes[None, :])
+        return bool(conflicts.any())
+
+    def run_cascade(self, get_predictions, weights=None):
+        """Run the cascade stages until the fused detections are certain.
+
+        get_predictions(members) returns the predictions of those members, or None if
+        they aren't available, in which case the frame is skipped and None returned.
+        """
+        weights = self.strategy_weights("cascade", weights)
+        members_run, predictions = [], []
+        for stages_run, members in enumerate(self.cascade_stages, 1):
+            stage_predictions = get_predictions(members)
+            if stage_predictions is None:
+                return None
+            members_run += members
+            predictions += stage_predictions
+            stage_weights = None if weights is None else [weights[i] for i in members_run]
+            fused = fuse(predictions, stage_weights, self.fusion_method, self.iou_threshold, self.score_threshold)
+            if not self.is_uncertain(*fused):
+                break
+        for stage in range(stages_run):
+            self.stage_counts[stage] += 1
+        self.last_members_run = members_run
+        return fused
+
+    def cascade_report(self):
+        """How often each cascade stage ran and the average number of models run per frame"""
+        frames = self.stage_counts[0]
+        lines = []
+        models_run = 0
+        for stage, (members, count) in enumerate(zip(self.cascade_stages, self.stage_counts)):
+            models_run += count * len(members)
+            lines.append(f"Stage {stage + 1} (models {members}): {count} frames "
+                         f"({100 * count / max(frames, 1):.1f}%)")
+        lines.append(f"Average models per frame: {models_run / max(frames, 1):.2f}")
+        return lines
+
+    def refuse(self, strategy=None, weights=None, frames=None):
+        """Fuse the cached predictions again, returns {frame index: (boxes, scores, classes)}.
+
+        Only frames with every needed member's prediction cached are included. For the
+        cascade the stage counts start over, so they describe this run.
+        """
+        num_models = len(self.model_paths)
+        cascade = (strategy or self.strategy) == "cascade"
+        if cascade:
+            self.stage_counts = [0] * len(self.cascade_stages)
+        fused = {}
+        for frame_index in (self.cache.frames() if frames is None else frames):
+            if cascade:
+                result = self.run_cascade(lambda members: self.cached_predictions(frame_index, members), weights)
+                if result is not None:
+                    fused[frame_index] = result
+                continue
+            predictions = self.cached_predictions(frame_index, range(num_models))
+            if predictions is not None:
+                fused[frame_index] = self.fuse(predictions, strategy, weights)
+        return fused
+
+    def cached_predictions(self, frame_index, members):
+        """The cached predictions of the members, or None if any of them is missing"""
+        predictions = [self.cache.get(frame_index, i) for i in members]
+        return None if any(p is None for p in predictions) else predictions
@@ -0,0 +1,104 @@
+"""Box fusion for combining the predictions of several detectors.
+
+Predictions are per-model (boxes, scores, classes) NumPy arrays: boxes (N, 4) in
+xyxy pixels, scores (N,) and class ids (N,). Overlaps are computed as one IoU
+matrix over all boxes, with boxes of different classes shifted apart so they
+never overlap, so fusing hundreds of boxes costs a few array operations.
+"""
+import numpy as np
+
+
+def box_iou(a, b):
+    """IoU matrix (len(a), len(b)) between two sets of xyxy boxes"""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def class_offset_boxes(boxes, classes):
+    """Shift each class to its own region so a single IoU matrix is class-aware"""
+    if len(boxes) == 0:
+        return boxes
+    offset = boxes.max() + 1
+    return boxes + (classes * offset)[:, None]
+
+
+def concat_predictions(predictions, weights=None, score_threshold=0.0):
+    """Stack per-model predictions into single arrays, scaling scores by the model weights.
+
+    Returns boxes, scores, classes and the index of the model each box came from,
+    without the boxes whose weighted score is below score_threshold.
+    """
+    if weights is None:
+        weights = np.ones(len(predictions))
+    boxes = [np.asarray(b, dtype=np.float32).reshape(-1, 4) for b, _, _ in predictions]
+    scores = [np.asarray(s, dtype=np.float32) * w for (_, s, _), w in zip(predictions, weights)]
+    classes = [np.asarray(c).astype(int) for _, _, c in predictions]
+    model_ids = [np.full(len(b), i) for i, b in enumerate(boxes)]
+    boxes, scores, classes, model_ids = (np.concatenate(x) for x in (boxes, scores, classes, model_ids))
+    keep = scores >= score_threshold
+    return boxes[keep], scores[keep], classes[keep], model_ids[keep]
+
+
+def nms(boxes, scores, classes, iou_threshold=0.5):
+    """Class-aware greedy NMS, returns the indices of the kept boxes, best first"""
+    order = np.argsort(-scores, kind="stable")
+    iou = box_iou(*(2 * [class_offset_boxes(boxes[order], classes[order])]))
+    suppressed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= iou[i] > iou_threshold
+    return order[keep]
+
+
+def weighted_boxes_fusion(boxes, scores, classes, model_ids, num_models, weights=None, iou_threshold=0.55):
+    """Merge overlapping boxes of the same class into one score-weighted average box.
+
+    Each group is seeded by the highest scoring box left and takes every remaining
+    box overlapping it. The fused score is the sum of each model's best score in
+    the group over the total model weight, so boxes found by fewer models score lower.
+    """
+    total_weight = float(np.sum(weights)) if weights is not None else float(num_models)
+    order = np.argsort(-scores, kind="stable")
+    boxes, scores, classes, model_ids = boxes[order], scores[order], classes[order], model_ids[order]
+    iou = box_iou(*(2 * [class_offset_boxes(boxes, classes)]))
+
+    assigned = np.zeros(len(boxes), dtype=bool)
+    fused_boxes, fused_scores, fused_classes = [], [], []
+    for i in range(len(boxes)):
+        if assigned[i]:
+            continue
+        members = ~assigned & (iou[i] > iou_threshold)
+        members[i] = True
+        assigned |= members
+        member_scores = scores[members]
+        fused_boxes.append((boxes[members] * member_scores[:, None]).sum(axis=0) / member_scores.sum())
+        best_per_model = np.zeros(num_models, dtype=np.float32)
+        np.maximum.at(best_per_model, model_ids[members], member_scores)
+        fused_scores.append(best_per_model.sum() / total_weight)
+        fused_classes.append(classes[i])
+
+    if not fused_boxes:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=int)
+    return np.array(fused_boxes), np.array(fused_scores), np.array(fused_classes)
+
+
+def fuse(predictions, weights=None, method="wbf", iou_threshold=0.5, score_threshold=0.3):
+    """Combine the predictions of all models into one set of boxes, scores and classes.
+
+    method is "nms" to keep only the best box of each overlapping group, or "wbf"
+    to average the group's coordinates.
+    """
+    boxes, scores, classes, model_ids = concat_predictions(predictions, weights, score_threshold)
+    if method == "nms":
+        keep = nms(boxes, scores, classes, iou_threshold)
+        return boxes[keep], scores[keep], classes[keep]
+    if method == "wbf":
+        return weighted_boxes_fusion(boxes, scores, classes, model_ids, len(predictions), weights, iou_threshold)
+    raise ValueError(f"Unknown fusion method: {method}")
@@ -0,0 +1,125 @@
+"""Shared preprocessing and single-graph execution for ensemble members.
+
+Every member gets the same frame, so the letterbox, normalization and tensor
+conversion is done once per input size and the same tensor is fed to each of
+them. Members with the same input size can also be exported as one combined
+ONNX graph with a shared input, so the whole group runs in one session call.
+"""
+import hashlib
+import os
+
+import cv2
+import numpy as np
+import torch
+from ultralytics import YOLO
+from ultralytics.utils import ops
+
+from detection_core import file_hash
+
+# Same thresholds as YOLO predict, so all execution paths give the same boxes
+PREDICT_CONF = 0.25
+PREDICT_IOU = 0.7
+
+
+def member_imgsz(model):
+    """The (height, width) input size a checkpoint was trained at"""
+    imgsz = model.overrides.get("imgsz", 640)
+    if isinstance(imgsz, int):
+        return imgsz, imgsz
+    return tuple(imgsz)
+
+
+def letterbox(frame, size):
+    """Resize and pad a BGR frame into a 1x3xHxW RGB float tensor in [0, 1].
+
+    Returns the tensor, the scale and the (left, top) padding to map boxes back.
+    """
+    height, width = size
+    frame_h, frame_w = frame.shape[:2]
+    ratio = min(height / frame_h, width / frame_w)
+    new_h, new_w = round(frame_h * ratio), round(frame_w * ratio)
+    top, left = (height - new_h) // 2, (width - new_w) // 2
+    canvas = np.full((height, width, 3), 114, dtype=np.uint8)
+    canvas[top:top + new_h, left:left + new_w] = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    tensor = np.ascontiguousarray(canvas[:, :, ::-1].transpose(2, 0, 1)[None], dtype=np.float32) / 255
+    return torch.from_numpy(tensor), ratio, (left, top)
+
+
+def unletterbox(boxes, ratio, pad, frame_shape):
+    """Map xyxy boxes from the letterboxed tensor back to the original frame"""
+    boxes = (boxes - np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)) / ratio
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, frame_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, frame_shape[0])
+    return boxes
+
+
+def predict_from_tensor(model, shared_input, frame_shape):
+    """Run one member on an already preprocessed input, returns boxes, confidences and classes"""
+    tensor, ratio, pad = shared_input
+    result = model.predict(tensor, imgsz=tuple(tensor.shape[2:]), verbose=False)[0]
+    boxes = unletterbox(result.boxes.xyxy.cpu().numpy(), ratio, pad, frame_shape)
+    return boxes, result.boxes.conf.cpu().numpy(), result.boxes.cls.cpu().numpy().astype(int)
+
+
+class _MemberStack(torch.nn.Module):
+    """All members behind one input, one output per member"""
+
+    def __init__(self, networks):
+        super().__init__()
+        self.networks = torch.nn.ModuleList(networks)
+
+    def forward(self, x):
+        outputs = []
+        for network in self.networks:
+            output = network(x)
+            # Detection heads return (decoded predictions, raw feature maps) outside export mode
+            outputs.append(output[0] if isinstance(output, (list, tuple)) else output)
+        return tuple(outputs)
+
+
+def combined_graph_path(model_paths, size, cache_dir="models"):
+    """Where the combined export of these members is cached, keyed by their content and the input size"""
+    digest = hashlib.sha256("".join(file_hash(path) for path in model_paths).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"ensemble_{len(model_paths)}_{digest}_{size[0]}x{size[1]}.onnx")
+
+
+def export_combined_graph(model_paths, size, cache_dir="models"):
+    """Export the members as one ONNX graph with a shared input, on first use"""
+    cached_path = combined_graph_path(model_paths, size, cache_dir)
+    if os.path.exists(cached_path):
+        return cached_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    networks = []
+    for path in model_paths:
+        network = YOLO(path).model.fuse().float().eval()
+        for parameter in network.parameters():
+            parameter.requires_grad = False
+        networks.append(network)
+    dummy = torch.zeros(1, 3, *size)
+    torch.onnx.export(_MemberStack(networks), dummy, cached_path, opset_version=12,
+                      input_names=["images"], output_names=[f"member_{i}" for i in range(len(networks))])
+    return cached_path
+
+
+class CombinedGraph:
+    """One onnxruntime session running several same-size members on a shared input"""
+
+    def __init__(self, model_paths, size, cache_dir="models"):
+        import onnxruntime  # Only needed for this execution path
+
+        self.size = size
+        self.num_members = len(model_paths)
+        self.session = onnxruntime.InferenceSession(export_combined_graph(model_paths, size, cache_dir),
+                                                    providers=["CPUExecutionProvider"])
+
+    def predict(self, shared_input, frame_shape):
+        """Run every member in one call, returns their (boxes, confidences, classes) in order"""
+        tensor, ratio, pad = shared_input
+        outputs = self.session.run(None, {"images": tensor.numpy()})
+        predictions = []
+        for output in outputs:
+            detections = ops.non_max_suppression(torch.from_numpy(output), PREDICT_CONF, PREDICT_IOU)[0].numpy()
+            boxes = unletterbox(detections[:, :4], ratio, pad, frame_shape)
+            predictions.append((boxes, detections[:, 4], detections[:, 5].astype(int)))
+        return predictions
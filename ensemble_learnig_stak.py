@@ -1,8 +1,14 @@
+import argparse
+import json
+import time
+
 import cv2
-import numpy as np
-from ultralytics import YOLO
 
-# Load five YOLOv8 models
+from ensemble_engine import EXECUTION_MODES, SCHEDULES, STRATEGIES, Ensemble
+from frame_source import open_source
+from video_writer import WRITER_BACKENDS, AsyncVideoWriter
+
+# Five YOLOv8 models
 model_paths = [
     r"C:\Users\ayuba\Downloads\best (9).pt",
     r"C:\Users\ayuba\Downloads\best (10).pt",
@@ -10,126 +16,137 @@ model_paths = [
     r"C:\Users\ayuba\Downloads\best (12).pt",
     r"C:\Users\ayuba\Downloads\best (11).pt"
 ]
-models = [YOLO(path) for path in model_paths]
+video_path = r"C:\Users\ayuba\Downloads\WLCCTVNVR_ch6_main_20250707212400_20250707235959.mp4"
 
 # --------------------------- ENSEMBLE METHODS ---------------------------
-
-# 1. Stacking: Weighted model confidence (favor best model)
-def run_stacking_inference(frame):
-    model_weights = [0.9, 0.9, 0.9, 0.9, 1.2]
-    all_preds = []
-
-    for i, model in enumerate(models):
-        result = model(frame, verbose=False)[0]
-        boxes = result.boxes.xyxy.cpu().numpy()
-        confs = result.boxes.conf.cpu().numpy()
-        cls_ids = result.boxes.cls.cpu().numpy()
-
-        for box, conf, cls_id in zip(boxes, confs, cls_ids):
-            all_preds.append([*box, conf * model_weights[i], int(cls_id)])
-
-    all_preds = np.array(all_preds)
-    if len(all_preds) == 0:
-        return []
-    return non_max_suppression(all_preds, iou_threshold=0.5)
-
-# 2. Bagging: Equal vote from all models
-def run_bagging_inference(frame):
-    all_preds = []
-
-    for model in models:
-        result = model(frame, verbose=False)[0]
-        boxes = result.boxes.xyxy.cpu().numpy()
-        confs = result.boxes.conf.cpu().numpy()
-        cls_ids = result.boxes.cls.cpu().numpy()
-
-        for box, conf, cls_id in zip(boxes, confs, cls_ids):
-            all_preds.append([*box, conf, int(cls_id)])
-
-    all_preds = np.array(all_preds)
-    if len(all_preds) == 0:
-        return []
-    return non_max_suppression(all_preds, iou_threshold=0.5)
-
-# 3. Boosting: Later models have higher confidence weight
-def run_boosting_inference(frame):
-    boost_weights = [0.7, 0.9, 1.0, 1.1, 1.3]
-    all_preds = []
-
-    for i, model in enumerate(models):
-        result = model(frame, verbose=False)[0]
-        boxes = result.boxes.xyxy.cpu().numpy()
-        confs = result.boxes.conf.cpu().numpy()
-        cls_ids = result.boxes.cls.cpu().numpy()
-
-        for box, conf, cls_id in zip(boxes, confs, cls_ids):
-            all_preds.append([*box, conf * boost_weights[i], int(cls_id)])
-
-    all_preds = np.array(all_preds)
-    if len(all_preds) == 0:
-        return []
-    return non_max_suppression(all_preds, iou_threshold=0.5)
-
-# --------------------------- NMS UTILITY ---------------------------
-def non_max_suppression(preds, iou_threshold=0.5):
-    boxes = preds[:, :4]
-    scores = preds[:, 4]
-    classes = preds[:, 5].astype(int)
-
-    indices = cv2.dnn.NMSBoxes(
-        bboxes=boxes.tolist(),
-        scores=scores.tolist(),
-        score_threshold=0.3,
-        nms_threshold=iou_threshold
-    )
-
-    final_results = []
-    if len(indices) > 0:
-        for i in indices.flatten():
-            final_results.append({
-                'box': boxes[i],
-                'score': scores[i],
-                'class': classes[i]
-            })
-
-    return final_results
-
-# --------------------------- VIDEO INFERENCE ---------------------------
-video_path = r"C:\Users\ayuba\Downloads\WLCCTVNVR_ch6_main_20250707212400_20250707235959.mp4"
-cap = cv2.VideoCapture(video_path)
-
-output_path = 'ensemble_output.mp4'
-fourcc = cv2.VideoWriter_fourcc(*'XVID')
-fps = int(cap.get(cv2.CAP_PROP_FPS))
-frame_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-frame_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-out = cv2.VideoWriter(output_path, fourcc, fps, (frame_w, frame_h))
-
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    # ------------------ Choose One Inference Method ------------------
-    # results = run_stacking_inference(frame)   # ✅ Stacking
-    results = run_bagging_inference(frame)   # ✅ Bagging
-    # results = run_boosting_inference(frame)  # ✅ Boosting
-
-    # Draw results
-    for res in results:
-        x1, y1, x2, y2 = map(int, res['box'])
-        label = f"Class {res['class']} {res['score']:.2f}"
+# stacking: weighted model confidence (favor best model)
+# bagging: equal vote from all models
+# boosting: later models have higher confidence weight
+# cascade: cheapest model first, the others only when its detections are uncertain
+# The weights of each are in ensemble_engine.STRATEGIES
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run an ensemble of YOLO models over a video")
+    parser.add_argument("--video", default=video_path, help="Input video")
+    parser.add_argument("--config", default=None,
+                        help="Ensemble config written by ensemble_prune.py, sets the models, strategy, "
+                             "weights and fusion")
+    parser.add_argument("--output", default="ensemble_output.mp4", help="Annotated output video")
+    parser.add_argument("--writer", choices=WRITER_BACKENDS, default="opencv",
+                        help="Encoder backend, both encode on a background thread (default: opencv)")
+    parser.add_argument("--codec", default=None,
+                        help="FourCC for opencv (default: XVID) or ffmpeg codec such as libx264, libx265")
+    parser.add_argument("--preset", default="veryfast", help="ffmpeg encoder preset (default: veryfast)")
+    parser.add_argument("--no-preview", action="store_true", help="Don't show the preview window")
+    parser.add_argument("--strategy", choices=list(STRATEGIES.keys()), default="bagging")
+    parser.add_argument("--weights", type=float, nargs="+", default=None,
+                        help="Per-model weights, overrides the strategy's weights")
+    parser.add_argument("--fusion", choices=["wbf", "nms"], default="wbf",
+                        help="wbf averages overlapping boxes, nms keeps only the best one of them")
+    parser.add_argument("--execution", choices=EXECUTION_MODES, default="separate",
+                        help="shared preprocesses each frame once for all models, graph also runs "
+                             "same-size models as one combined ONNX graph (needs onnxruntime)")
+    parser.add_argument("--schedule", choices=SCHEDULES, default="all",
+                        help="round_robin runs only --members-per-frame models per frame in rotation and "
+                             "reuses the others' recent predictions")
+    parser.add_argument("--members-per-frame", type=int, default=1)
+    parser.add_argument("--temporal-window", type=int, default=5,
+                        help="Frames a model's last prediction is reused for (default: 5)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Keep the per-model predictions here, reruns only fuse them again")
+    parser.add_argument("--cascade-stages", nargs="+", default=None,
+                        help="Model indices per cascade stage, cheapest first, e.g. 4 0,1,2,3 "
+                             "(default: the first model, then the rest)")
+    parser.add_argument("--cascade-band", type=float, nargs=2, default=[0.3, 0.7], metavar=("LOW", "HIGH"),
+                        help="Scores in this range are ambiguous and run the next stage (default: 0.3 0.7)")
+    parser.add_argument("--refuse", action="store_true",
+                        help="Only fuse the predictions in --cache-dir with the given strategy/weights and report")
+    return parser.parse_args(argv)
+
+
+def draw_detections(frame, boxes, scores, classes):
+    for box, score, cls in zip(boxes, scores, classes):
+        x1, y1, x2, y2 = map(int, box)
+        label = f"Class {int(cls)} {score:.2f}"
         cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
         cv2.putText(frame, label, (x1, y1 - 5),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
 
-    out.write(frame)
-    cv2.imshow('YOLOv8 Ensemble (Bagging/Boosting/Stacking)', frame)
 
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
+def refuse_cached(ensemble):
+    """Fuse the cached predictions again and print how long it took"""
+    start = time.perf_counter()
+    fused = ensemble.refuse()
+    elapsed = time.perf_counter() - start
+    detections = sum(len(scores) for _, scores, _ in fused.values())
+    print(f"Re-fused {len(fused)} frames in {elapsed:.2f} s: {detections} detections "
+          f"({detections / max(len(fused), 1):.2f} per frame)")
 
-# Cleanup
-cap.release()
-out.release()
-cv2.destroyAllWindows()
+
+# --------------------------- VIDEO INFERENCE ---------------------------
+def main(argv=None):
+    args = parse_args(argv)
+    members = model_paths
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+        members = config["models"]
+        args.strategy, args.weights, args.fusion = config["strategy"], config["weights"], config["fusion"]
+    cascade_stages = None
+    if args.cascade_stages:
+        cascade_stages = [[int(i) for i in stage.split(",")] for stage in args.cascade_stages]
+    ensemble = Ensemble(members, cache_dir=args.cache_dir, strategy=args.strategy, weights=args.weights,
+                        fusion_method=args.fusion, cascade_stages=cascade_stages,
+                        cascade_band=tuple(args.cascade_band), execution=args.execution,
+                        schedule=args.schedule, members_per_frame=args.members_per_frame,
+                        temporal_window=args.temporal_window, source=args.video)
+    if args.refuse:
+        refuse_cached(ensemble)
+        if args.strategy == "cascade":
+            print("\n".join(ensemble.cascade_report()))
+        return
+
+    cap = open_source(args.video)
+
+    output_path = args.output
+    codec = args.codec or ('XVID' if args.writer == "opencv" else None)
+    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    frame_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    # Encoding happens on a background thread, write() only queues the frame
+    out = AsyncVideoWriter(output_path, fps, (frame_w, frame_h), backend=args.writer, codec=codec,
+                           preset=args.preset)
+
+    frame_index = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        # Frames already in the cache are only fused again
+        boxes, scores, classes = ensemble.detect(frame_index, frame)
+        frame_index += 1
+
+        # Draw results
+        draw_detections(frame, boxes, scores, classes)
+
+        out.write(frame)
+        if args.no_preview:
+            continue
+        cv2.imshow('YOLOv8 Ensemble (Bagging/Boosting/Stacking)', frame)
+
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+
+    # Cleanup
+    cap.release()
+    out.release()
+    cv2.destroyAllWindows()
+    ensemble.close()
+    if args.strategy == "cascade":
+        print("\n".join(ensemble.cascade_report()))
+
+
+if __name__ == "__main__":
+    main()
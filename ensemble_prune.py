@@ -0,0 +1,179 @@
+"""Member contribution analysis and pruning for the ensemble.
+
+Works from the same labelled data and prediction cache as ensemble_benchmark.py
+(members missing from the cache are run first):
+
+    python ensemble_prune.py --images dataset/val --cache-dir bench_cache --max-drop 0.01
+
+For each member it reports how often its boxes agree with another member, the
+true positives only it finds, its cost per frame and how much the ensemble's mAP
+drops without it. Members are then removed one at a time, cheapest loss first,
+while the ensemble stays within --max-drop of the full ensemble's mAP50, and the
+remaining ensemble is written as a config the ensemble script loads with --config.
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from ensemble_benchmark import iter_labelled_clip, iter_labelled_images, run_members, score_configuration
+from ensemble_engine import STRATEGIES, Ensemble
+from ensemble_fusion import box_iou
+from ensemble_learnig_stak import model_paths
+
+
+def same_class_iou(boxes_a, classes_a, boxes_b, classes_b):
+    """IoU matrix where boxes of different classes never overlap"""
+    iou = box_iou(boxes_a, boxes_b)
+    iou[classes_a[:, None] != classes_b[None, :]] = 0
+    return iou
+
+
+def matched_ground_truth(prediction, gt, iou_threshold=0.5):
+    """Which ground truth boxes the prediction finds, matched greedily by score"""
+    boxes, scores, classes = prediction
+    gt_boxes, gt_classes = gt
+    matched = np.zeros(len(gt_boxes), dtype=bool)
+    if len(boxes) == 0 or len(gt_boxes) == 0:
+        return matched
+    iou = same_class_iou(boxes, classes, gt_boxes, gt_classes)
+    for i in np.argsort(-scores):
+        candidates = np.where(~matched & (iou[i] >= iou_threshold))[0]
+        if len(candidates):
+            matched[candidates[np.argmax(iou[i, candidates])]] = True
+    return matched
+
+
+def member_statistics(ensemble, ground_truth, iou_threshold=0.5):
+    """Agreement with the other members and unique true positives of each member"""
+    num_models = len(ensemble.model_paths)
+    agreed = np.zeros(num_models)
+    boxes_total = np.zeros(num_models)
+    true_positives = np.zeros(num_models, dtype=int)
+    unique_true_positives = np.zeros(num_models, dtype=int)
+    for frame_index, gt in ground_truth.items():
+        predictions = []
+        for i in range(num_models):
+            boxes, scores, classes = ensemble.cache.get(frame_index, i)
+            keep = scores >= ensemble.score_threshold
+            predictions.append((boxes[keep], scores[keep], classes[keep]))
+
+        for i, (boxes, _, classes) in enumerate(predictions):
+            boxes_total[i] += len(boxes)
+            if len(boxes) == 0:
+                continue
+            found = np.zeros(len(boxes), dtype=bool)
+            for j, (other_boxes, _, other_classes) in enumerate(predictions):
+                if j != i and len(other_boxes):
+                    found |= (same_class_iou(boxes, classes, other_boxes, other_classes) >= iou_threshold).any(axis=1)
+            agreed[i] += found.sum()
+
+        found_gt = np.array([matched_ground_truth(p, gt, iou_threshold) for p in predictions])
+        if found_gt.size:
+            true_positives += found_gt.sum(axis=1)
+            only_one = found_gt.sum(axis=0) == 1
+            unique_true_positives += (found_gt & only_one).sum(axis=1)
+
+    agreement = agreed / np.maximum(boxes_total, 1)
+    return agreement, true_positives, unique_true_positives
+
+
+def prune(ensemble, strategy, ground_truth, timings, max_drop):
+    """Greedily drop members while the mAP50 stays within max_drop of the full ensemble.
+
+    Returns the kept members, the baseline and final scores, and the removal steps.
+    """
+    members = list(range(len(ensemble.model_paths)))
+    baseline = score_configuration(ensemble, members, strategy, ground_truth, timings)
+    current = baseline
+    steps = []
+    while len(members) > 1:
+        candidates = []
+        for i in members:
+            remaining = [m for m in members if m != i]
+            candidates.append((score_configuration(ensemble, remaining, strategy, ground_truth, timings), i))
+        best, removed = max(candidates, key=lambda c: (c[0]["mAP50"], c[0]["fps"]))
+        if baseline["mAP50"] - best["mAP50"] > max_drop:
+            break
+        members.remove(removed)
+        current = best
+        steps.append((removed, best))
+    return members, baseline, current, steps
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure each ensemble member's contribution and prune the ensemble")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--images", help="Folder of images with YOLO label files")
+    source.add_argument("--video", help="Labelled clip, requires --labels")
+    parser.add_argument("--labels", help="Folder of frame_NNNNNN.txt YOLO labels for --video")
+    parser.add_argument("--models", nargs="+", default=model_paths, help="Member model files")
+    parser.add_argument("--strategy", choices=[s for s in STRATEGIES if s != "cascade"], default="bagging")
+    parser.add_argument("--fusion", choices=["wbf", "nms"], default="wbf")
+    parser.add_argument("--cache-dir", default=None, help="Prediction cache shared with ensemble_benchmark.py")
+    parser.add_argument("--max-drop", type=float, default=0.01,
+                        help="Largest mAP50 loss allowed compared to the full ensemble (default: 0.01)")
+    parser.add_argument("--output", default="ensemble_pruned.json", help="Pruned ensemble config to write")
+    args = parser.parse_args(argv)
+    if args.video and not args.labels:
+        parser.error("--video requires --labels")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    weights = STRATEGIES[args.strategy]
+    if weights is not None and len(weights) != len(args.models):
+        print(f"Error: {args.strategy} has {len(weights)} weights for {len(args.models)} models")
+        return 1
+    ensemble = Ensemble(args.models, cache_dir=args.cache_dir, fusion_method=args.fusion,
+                        source=args.images or args.video)
+    samples = iter_labelled_images(args.images) if args.images else iter_labelled_clip(args.video, args.labels)
+    ground_truth, timings = run_members(ensemble, samples, args.cache_dir)
+    if not ground_truth:
+        print("Error: No labelled frames found")
+        return 1
+
+    num_models = len(args.models)
+    members = list(range(num_models))
+    full = score_configuration(ensemble, members, args.strategy, ground_truth, timings)
+    agreement, true_positives, unique_true_positives = member_statistics(ensemble, ground_truth)
+    mean_times = np.array([np.mean([timings[f][i] for f in ground_truth]) for i in members])
+
+    print(f"Full ensemble ({args.strategy}): mAP50 {full['mAP50']:.3f}, recall {full['recall']:.3f}, "
+          f"{full['fps']:.2f} FPS on {len(ground_truth)} labelled frames\n")
+    print(f"{'model':<5} {'ms/frame':>8} {'agree':>6} {'TP':>6} {'unique TP':>9} {'mAP50 w/o':>9} {'delta':>7}  file")
+    for i in members:
+        without = score_configuration(ensemble, [m for m in members if m != i], args.strategy,
+                                      ground_truth, timings)
+        print(f"{i:<5} {mean_times[i] * 1000:>8.1f} {agreement[i]:>6.2f} {true_positives[i]:>6} "
+              f"{unique_true_positives[i]:>9} {without['mAP50']:>9.3f} {without['mAP50'] - full['mAP50']:>+7.3f}  "
+              f"{args.models[i]}")
+
+    kept, baseline, pruned, steps = prune(ensemble, args.strategy, ground_truth, timings, args.max_drop)
+    print()
+    for removed, score in steps:
+        print(f"Dropped model {removed}: mAP50 {score['mAP50']:.3f}, {score['fps']:.2f} FPS")
+    saved = 1 - mean_times[kept].sum() / mean_times.sum()
+    print(f"Kept {len(kept)} of {num_models} models: mAP50 {baseline['mAP50']:.3f} -> {pruned['mAP50']:.3f}, "
+          f"{baseline['fps']:.2f} -> {pruned['fps']:.2f} FPS ({saved:.0%} less model compute per frame)")
+
+    config = {
+        "models": [args.models[i] for i in kept],
+        "strategy": args.strategy,
+        "weights": None if weights is None else [weights[i] for i in kept],
+        "fusion": args.fusion,
+        "max_drop": args.max_drop,
+        "baseline": {"mAP50": baseline["mAP50"], "fps": baseline["fps"]},
+        "pruned": {"mAP50": pruned["mAP50"], "fps": pruned["fps"]},
+        "removed": [args.models[removed] for removed, _ in steps],
+    }
+    with open(args.output, "w") as f:
+        json.dump(config, f, indent=2)
+    print(f"Pruned ensemble config saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,51 +2,110 @@ import cv2
 import os
 import numpy as np
 
+from frame_hash import HashIndex
+from frame_source import open_source
+from image_writer import AsyncImageWriter
+
 # Create a folder to save the extracted frames
 output_folder = R'D:\extract_frame_web\EXTRED_PACKED'
-os.makedirs(output_folder, exist_ok=True)
 
-def extract_unique_frames_from_video(video_path, threshold=30):
+
+class ChangeDetector:
+    """Decides whether a frame differs enough from the last saved one to be worth keeping.
+
+    Frames are compared as small blurred grayscale copies, and a frame counts as
+    changed when the share of pixels differing by more than threshold reaches
+    changed_ratio, so sensor noise on a few pixels doesn't count. With
+    background_subtraction the share of foreground pixels of a MOG2 model is used
+    instead, which ignores gradual lighting changes.
+    """
+
+    def __init__(self, threshold=30, changed_ratio=0.01, min_gap=1.0, background_subtraction=False,
+                 compare_width=160):
+        self.threshold = threshold
+        self.changed_ratio = changed_ratio
+        self.min_gap = min_gap  # Seconds between two saved frames
+        self.compare_width = compare_width
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False) if background_subtraction else None
+        self.reference = None  # Small copy of the last saved frame
+        self.last_saved_time = None
+
+    def small_gray(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.compare_width, max(1, round(height * self.compare_width / width)))
+        gray = cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (3, 3), 0)
+
+    def changed_fraction(self, small):
+        if self.subtractor is not None:
+            mask = self.subtractor.apply(small)
+            return np.count_nonzero(mask) / mask.size
+        if self.reference is None:
+            return 1.0
+        diff = cv2.absdiff(self.reference, small)
+        return np.count_nonzero(diff > self.threshold) / diff.size
+
+    def check(self, frame, timestamp):
+        """The frame's small copy if it changed enough to be saved, else None; call saved() once it is"""
+        small = self.small_gray(frame)
+        # The background model has to see every frame to stay current
+        fraction = self.changed_fraction(small)
+        if self.last_saved_time is not None and timestamp - self.last_saved_time < self.min_gap:
+            return None
+        if self.reference is not None and fraction < self.changed_ratio:
+            return None
+        return small
+
+    def saved(self, small, timestamp):
+        """Make a saved frame the new reference and restart the gap from it"""
+        self.reference = small
+        self.last_saved_time = timestamp
+
+
+def extract_unique_frames_from_video(video_path, threshold=30, changed_ratio=0.01, min_gap=1.0,
+                                     background_subtraction=False, dedupe_distance=6, hash_method="dhash",
+                                     image_format="jpg", quality=None, png_compression=3):
+    os.makedirs(output_folder, exist_ok=True)
+
     # Open the video file
-    cap = cv2.VideoCapture(video_path)
+    cap = open_source(video_path)
 
     if not cap.isOpened():
         print("Error: Unable to open the video file.")
         return
 
+    detector = ChangeDetector(threshold, changed_ratio, min_gap, background_subtraction)
+    # Remembers every saved frame, so a scene that comes back later isn't saved again
+    index = HashIndex(hash_method, dedupe_distance) if dedupe_distance is not None else None
     frame_count = 0  # Initialize frame counter
-    last_frame = None  # To store the previous frame
-
-    while True:
-        success, frame = cap.read()  # Read each frame from the video
-        if not success:
-            break  # Exit loop when video ends
 
-        if last_frame is not None:
-            # Calculate the absolute difference between the current frame and the last frame
-            diff = cv2.absdiff(last_frame, frame)
+    # Frames are encoded on background threads while the next ones are decoded
+    with AsyncImageWriter(image_format, quality, png_compression) as writer:
+        while True:
+            success, frame = cap.read()  # Read each frame from the video
+            if not success:
+                break  # Exit loop when video ends
 
-            # Convert the difference to grayscale
-            gray_diff = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY)
-
-            # Calculate the sum of the pixel differences
-            non_zero_count = np.sum(gray_diff > threshold)
-
-            # If the number of different pixels exceeds a threshold, save the frame
-            if non_zero_count > 0:
-                image_path = os.path.join(output_folder, f'frame_{frame_count}.jpg')
-                cv2.imwrite(image_path, frame)
-                print(f'Saved: {image_path}')
-                frame_count += 1
-
-        # Update the last frame
-        last_frame = frame
+            # Save the frame if enough of the picture changed since the last saved frame
+            small = detector.check(frame, cap.timestamp)
+            if small is None:
+                continue
+            # A duplicate of an earlier saved frame is dropped without moving the reference
+            if index is not None and not index.add_if_new(frame, frame_count):
+                continue
+            image_path = os.path.join(output_folder, f'frame_{frame_count}{writer.extension}')
+            writer.write(image_path, frame)
+            detector.saved(small, cap.timestamp)
+            print(f'Saved: {image_path}')
+            frame_count += 1
 
     cap.release()
     cv2.destroyAllWindows()
 
-# Path to your video file
-video_path = r"C:\Users\ayuba\Downloads\WLCCTVNVR_ch2_main_20250303170800_20250303182400.mp4"
 
-# Call the function to extract unique frames
-extract_unique_frames_from_video(video_path)
+if __name__ == "__main__":
+    # Path to your video file
+    video_path = r"C:\Users\ayuba\Downloads\WLCCTVNVR_ch2_main_20250303170800_20250303182400.mp4"
+
+    # Call the function to extract unique frames
+    extract_unique_frames_from_video(video_path)
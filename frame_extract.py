@@ -0,0 +1,236 @@
+"""Parallel extraction of frames from a video into image files.
+
+The frames to extract come from a sampling mode over a frame range:
+
+    all           - every frame
+    every_n       - every Nth frame
+    every_seconds - one frame every T seconds
+    evenly        - N frames spread evenly over the range
+
+They are split into one contiguous segment per worker process. Each worker opens
+its own frame source, seeks to the start of its segment and writes
+frame_NNNNNN.jpg files named by absolute frame index, so the output is the same
+as a single pass. Frames between two wanted ones are skipped with grab(), which
+doesn't convert them, or with a seek when the gap is long. Images are encoded
+by an AsyncImageWriter in each worker, so decoding continues while earlier
+frames are saved.
+
+Workers are this script run with --worker, so they only import OpenCV and the
+frame and image modules, never the application that started them (with
+multiprocessing's spawn every worker would re-import the GUI, torch included).
+Each one reads its job as JSON on stdin and reports progress lines on stdout,
+which reader threads collect for the caller to poll, e.g. from a QTimer, so a
+GUI stays responsive:
+
+    frames = sample_frames(0, 1799, fps=30, mode="every_seconds", value=1)
+    extraction = ParallelExtraction("video.mp4", frames, "frames")
+    extraction.start()
+    while not extraction.finished:
+        print(extraction.poll(), "frames written")
+        time.sleep(0.2)
+"""
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+
+import cv2
+
+from frame_source import available_backends, best_backend, open_source
+from image_writer import AsyncImageWriter
+
+PROGRESS_EVERY = 25  # Frames between progress messages from a worker
+WRITER_THREADS = 2  # Encoder threads per worker, decoding keeps one core busy too
+SEEK_GAP = 250  # Frames to the next wanted frame above which seeking beats grabbing
+SAMPLING_MODES = ["all", "every_n", "every_seconds", "evenly"]
+
+
+def sample_frames(start_frame, end_frame, fps, mode="all", value=None):
+    """Sorted indices of the frames in start_frame..end_frame that a sampling mode keeps"""
+    if mode == "all":
+        return list(range(start_frame, end_frame + 1))
+    if mode == "every_n":
+        return list(range(start_frame, end_frame + 1, max(1, int(value))))
+    if mode == "every_seconds":
+        step = max(value * fps, 1.0)
+        count = int((end_frame - start_frame) / step) + 1
+        return sorted({start_frame + round(i * step) for i in range(count)})
+    if mode == "evenly":
+        count = max(1, min(int(value), end_frame - start_frame + 1))
+        if count == 1:
+            return [start_frame]
+        step = (end_frame - start_frame) / (count - 1)
+        return sorted({start_frame + round(i * step) for i in range(count)})
+    raise ValueError(f"Unknown sampling mode: {mode}")
+
+
+def split_frames(frames, segments):
+    """Split a sorted list of frame indices into up to segments contiguous pieces"""
+    segments = max(1, min(segments, len(frames)))
+    bounds = [len(frames) * i // segments for i in range(segments + 1)]
+    return [frames[bounds[i]:bounds[i + 1]] for i in range(segments)]
+
+
+def extract_segment(video_path, backend, threads, frames, output_path, image_format, quality, png_compression,
+                    report, stop):
+    """Write the given frames, reporting with report(kind, value): progress, error and finally done"""
+    cv2.setNumThreads(1)  # The other workers already keep the cores busy
+    written = 0
+    reported = 0
+    try:
+        cap = open_source(video_path, backend=backend, threads=threads)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open {video_path}")
+        position = None  # Index of the next frame the source returns
+        with AsyncImageWriter(image_format, quality, png_compression, threads=WRITER_THREADS) as writer:
+            for frame_index in frames:
+                if stop.is_set():
+                    break
+                if position is None or frame_index - position > SEEK_GAP:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+                    position = frame_index
+                # Frames in between are decoded but never converted or saved
+                while position < frame_index and cap.grab():
+                    position += 1
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                position += 1
+                writer.write(os.path.join(output_path, f"frame_{frame_index:06d}{writer.extension}"), frame)
+                written += 1
+                if written - reported >= PROGRESS_EVERY:
+                    report("progress", written - reported)
+                    reported = written
+        cap.release()
+    except Exception as e:
+        report("error", str(e))
+    report("done", written - reported)
+
+
+def worker_main():
+    """Entry point of a worker process: job as a JSON line on stdin, "stop" on stdin cancels"""
+    job = json.loads(sys.stdin.readline())
+    stop = threading.Event()
+
+    def wait_for_stop():
+        sys.stdin.readline()  # "stop", or EOF when the parent goes away
+        stop.set()
+
+    threading.Thread(target=wait_for_stop, daemon=True).start()
+
+    # stdout only carries messages, anything else printed goes to stderr
+    channel = sys.stdout
+    sys.stdout = sys.stderr
+
+    def report(kind, value):
+        channel.write(json.dumps([kind, value]) + "\n")
+        channel.flush()
+
+    extract_segment(job["video_path"], job["backend"], job["threads"], job["frames"], job["output_path"],
+                    job["image_format"], job["quality"], job["png_compression"], report, stop)
+
+
+class ParallelExtraction:
+    """Worker processes writing the given frames of a video into output_path"""
+
+    def __init__(self, video_path, frames, output_path, workers=None, image_format="jpg", quality=None,
+                 png_compression=3):
+        if not frames:
+            raise ValueError("No frames to extract")
+        self.video_path = video_path
+        self.output_path = output_path
+        self.total_frames = len(frames)
+        self.segments = split_frames(frames, workers or os.cpu_count() or 1)
+        self.frames_written = 0
+        self.errors = []
+        self._segments_done = 0
+        self._messages = queue.Queue()
+        # Resolve the backend once here instead of benchmarking it in every worker
+        backend = best_backend(video_path)
+        sampled = frames[-1] - frames[0] + 1 != len(frames)
+        if sampled and backend == "ffmpeg":
+            # The pipe always receives converted frames, grab() would skip nothing; PyAV and OpenCV skip cheaply
+            backend = "pyav" if "pyav" in available_backends() else "opencv"
+        threads = max(1, (os.cpu_count() or 1) // len(self.segments))
+        self._jobs = [
+            {"video_path": video_path, "backend": backend, "threads": threads, "frames": segment,
+             "output_path": output_path, "image_format": image_format, "quality": quality,
+             "png_compression": png_compression}
+            for segment in self.segments
+        ]
+        self._processes = []
+        self._readers = []
+
+    def start(self):
+        for job in self._jobs:
+            process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker"],
+                                       stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                                       creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+            process.stdin.write(json.dumps(job) + "\n")
+            process.stdin.flush()
+            reader = threading.Thread(target=self._read_messages, args=(process, job["frames"][0]), daemon=True)
+            reader.start()
+            self._processes.append(process)
+            self._readers.append(reader)
+
+    def _read_messages(self, process, segment_start):
+        for line in process.stdout:
+            kind, value = json.loads(line)
+            self._messages.put((kind, segment_start, value))
+        process.wait()
+
+    def poll(self):
+        """Take the workers' messages without blocking, returns the frames written so far"""
+        # Checked before draining, a reader only ends after queueing everything its worker sent
+        alive = any(reader.is_alive() for reader in self._readers)
+        while True:
+            try:
+                kind, segment_start, value = self._messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "error":
+                self.errors.append(f"Segment from frame {segment_start}: {value}")
+                continue
+            self.frames_written += value
+            if kind == "done":
+                self._segments_done += 1
+        if not self.finished and not alive:
+            # A worker died without reporting, e.g. killed by the system
+            self.errors.append("A worker process exited unexpectedly")
+            self._segments_done = len(self.segments)
+        return self.frames_written
+
+    @property
+    def finished(self):
+        return self._segments_done == len(self.segments)
+
+    @property
+    def progress(self):
+        """Share of the range written, from 0 to 1"""
+        return self.frames_written / self.total_frames if self.total_frames else 1.0
+
+    def cancel(self):
+        """Ask the workers to stop after their current frame and wait for them"""
+        for process in self._processes:
+            try:
+                process.stdin.write("stop\n")
+                process.stdin.flush()
+            except OSError:
+                pass  # Already finished
+        self.join()
+
+    def join(self):
+        for reader in self._readers:
+            reader.join()
+        for process in self._processes:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+        self.poll()
+
+
+if __name__ == "__main__" and "--worker" in sys.argv[1:]:
+    worker_main()
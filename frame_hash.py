@@ -0,0 +1,201 @@
+"""Perceptual hashes and a near-duplicate index for extracted frames.
+
+Frames are reduced to 64-bit dHash or pHash values and stored in a multi-index
+hash table, so checking a new frame against everything saved so far only
+compares it with the few stored hashes that share a nearly equal 16-bit chunk
+instead of every stored hash.
+
+Dedupe an existing folder of extracted frames:
+
+    python frame_hash.py "E:/Railway Project/Extracted_frame" --distance 6 --move duplicates
+"""
+import argparse
+import itertools
+import os
+import shutil
+import sys
+import time
+
+import cv2
+import numpy as np
+
+HASH_METHODS = ["dhash", "phash"]
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def dhash(frame, hash_size=8):
+    """Difference hash: whether each pixel is brighter than its right neighbour"""
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return bits_to_int(small[:, 1:] > small[:, :-1])
+
+
+def phash(frame, hash_size=8):
+    """DCT hash: whether each low frequency coefficient is above their median"""
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (hash_size * 4, hash_size * 4), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(np.float32(small))[:hash_size, :hash_size]
+    return bits_to_int(low > np.median(low[1:]))  # Median without the DC term, which only tracks brightness
+
+
+def bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), "big")
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+HASH_FUNCTIONS = {"dhash": dhash, "phash": phash}
+
+
+class MultiIndexHash:
+    """Hashes split into 16-bit chunks, each chunk indexed in its own table.
+
+    Two hashes within max_distance of each other differ by at most
+    max_distance // chunks bits in at least one chunk, so a lookup only probes
+    those nearby keys in each table and compares the few hashes found there.
+    """
+
+    def __init__(self, max_distance, bits=64, chunk_bits=16):
+        self.max_distance = max_distance
+        self.chunk_bits = chunk_bits
+        self.chunks = -(-bits // chunk_bits)
+        self.radius = max_distance // self.chunks
+        self.chunk_mask = (1 << chunk_bits) - 1
+        # Every chunk value within radius of 0, XORed with a key gives the keys to probe
+        self.flips = [sum(1 << bit for bit in positions) for r in range(self.radius + 1)
+                      for positions in itertools.combinations(range(chunk_bits), r)]
+        self.tables = [{} for _ in range(self.chunks)]
+        self.entries = []  # (hash, item)
+
+    def keys(self, value):
+        return [(value >> (i * self.chunk_bits)) & self.chunk_mask for i in range(self.chunks)]
+
+    def add(self, value, item=None):
+        entry = len(self.entries)
+        self.entries.append((value, item))
+        for table, key in zip(self.tables, self.keys(value)):
+            table.setdefault(key, []).append(entry)
+
+    def find(self, value, max_distance=None):
+        """The closest stored (distance, hash, item) within max_distance, or None"""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        best = None
+        seen = set()
+        for table, key in zip(self.tables, self.keys(value)):
+            for flip in self.flips:
+                for entry in table.get(key ^ flip, ()):
+                    if entry in seen:
+                        continue
+                    seen.add(entry)
+                    stored, item = self.entries[entry]
+                    distance = hamming(value, stored)
+                    if distance <= max_distance and (best is None or distance < best[0]):
+                        best = (distance, stored, item)
+                        if distance == 0:
+                            return best
+        return best
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class HashIndex:
+    """Frames seen during an extraction run, to skip ones that look like any already saved"""
+
+    def __init__(self, method="dhash", max_distance=6, hash_size=8):
+        if method not in HASH_FUNCTIONS:
+            raise ValueError(f"Unknown hash method: {method}")
+        self.method = method
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.table = MultiIndexHash(max_distance, bits=hash_size * hash_size)
+
+    def hash(self, frame):
+        return HASH_FUNCTIONS[self.method](frame, self.hash_size)
+
+    def find(self, frame):
+        """The closest stored (distance, hash, item) within max_distance, or None"""
+        return self.table.find(self.hash(frame), self.max_distance)
+
+    def add_if_new(self, frame, item=None):
+        """Store the frame's hash unless a near-duplicate is already stored, returns whether it was new"""
+        value = self.hash(frame)
+        if self.table.find(value, self.max_distance) is not None:
+            return False
+        self.table.add(value, item)
+        return True
+
+    def __len__(self):
+        return len(self.table)
+
+
+def image_files(folder):
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def dedupe_folder(folder, method="dhash", max_distance=6, move_to=None, delete=False):
+    """Find images in folder that are near-duplicates of an earlier one (in name order).
+
+    Duplicates are moved to move_to or deleted when asked, returns (duplicate, original) pairs.
+    """
+    index = HashIndex(method, max_distance)
+    duplicates = []
+    lookup_time = 0.0
+    if move_to:
+        os.makedirs(move_to, exist_ok=True)
+    for path in image_files(folder):
+        frame = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if frame is None:
+            print(f"Skipping unreadable image: {path}")
+            continue
+        value = index.hash(frame)
+        start = time.perf_counter()
+        match = index.table.find(value, max_distance)
+        lookup_time += time.perf_counter() - start
+        if match is None:
+            index.table.add(value, path)
+            continue
+        duplicates.append((path, match[2]))
+        if move_to:
+            shutil.move(path, os.path.join(move_to, os.path.basename(path)))
+        elif delete:
+            os.remove(path)
+
+    checked = len(index) + len(duplicates)
+    if checked:
+        print(f"Checked {checked} images, {len(duplicates)} duplicates, {len(index)} unique "
+              f"({lookup_time / checked * 1000:.3f} ms per lookup)")
+    return duplicates
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Remove near-duplicate frames from a folder of extracted images")
+    parser.add_argument("folder", help="Folder of extracted frames")
+    parser.add_argument("--method", choices=HASH_METHODS, default="dhash")
+    parser.add_argument("--distance", type=int, default=6,
+                        help="Largest Hamming distance (of 64 bits) that counts as a duplicate (default: 6)")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--move", metavar="DIR", help="Move duplicates into this folder")
+    action.add_argument("--delete", action="store_true", help="Delete duplicates")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.isdir(args.folder):
+        print(f"Error: {args.folder} is not a folder")
+        return 1
+    duplicates = dedupe_folder(args.folder, args.method, args.distance, args.move, args.delete)
+    if not args.move and not args.delete:
+        for duplicate, original in duplicates:
+            print(f"{duplicate} duplicates {original}")
+        if duplicates:
+            print("Nothing was changed, use --move or --delete to remove them")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,442 @@
+"""Frame sources shared by the GUI and the scripts.
+
+Every backend is used like cv2.VideoCapture (read, grab, get, set, isOpened,
+release) so it can replace it directly, and also reports the decoder thread
+count and the timestamp of the last frame. Backends:
+
+    opencv - cv2.VideoCapture
+    ffmpeg - an ffmpeg process writing raw BGR frames to a pipe; scaling and the
+             colour conversion happen inside ffmpeg
+    pyav   - PyAV (libav bindings) with frame-threaded decoding
+
+Live sources (streams, cameras) reconnect when reading fails. With backend
+"auto" a short read benchmark picks the fastest available backend for a file,
+the choice is remembered for the rest of the session, and live sources use opencv:
+
+    source = open_source("video.mp4")
+    ret, frame = source.read()
+"""
+import argparse
+import importlib.util
+import os
+import shutil
+import time
+from fractions import Fraction
+
+import cv2
+import numpy as np
+
+BACKEND_NAMES = ["opencv", "ffmpeg", "pyav"]
+
+# Best backend per (source, size), filled by best_backend
+_best_backends = {}
+
+
+def is_live(source):
+    """True for streams and camera indexes, False for files on disk"""
+    return not os.path.exists(str(source))
+
+
+def parse_rate(rate):
+    """Frames per second from an ffprobe rate such as "30000/1001", 0 if unknown"""
+    try:
+        return float(Fraction(rate))
+    except (ValueError, ZeroDivisionError, TypeError):
+        return 0.0
+
+
+def rtsp_options(source):
+    """Use TCP for RTSP, UDP drops packets on busy networks and corrupts frames"""
+    return {"rtsp_transport": "tcp"} if str(source).lower().startswith("rtsp") else {}
+
+
+def input_options(source, low_latency=False):
+    """Demuxer options for ffmpeg and PyAV, low_latency turns off input buffering"""
+    options = rtsp_options(source)
+    if low_latency:
+        options.update({"fflags": "nobuffer", "flags": "low_delay"})
+    return options
+
+
+class FrameSource:
+    """Base class, a subclass implements one decoding backend.
+
+    size is an optional (width, height) the frames are scaled to, threads the
+    decoder thread count (0 lets the decoder choose). Reading a live source
+    retries reconnect_attempts times, sleeping in between; with 0 a failed read
+    returns at once and the caller can reconnect() when it suits it, e.g. from
+    a worker thread rather than a GUI thread.
+    """
+    name = None
+
+    def __init__(self, source, size=None, threads=0, reconnect_attempts=5, reconnect_delay=1.0):
+        self.source = source
+        self.size = size
+        self.threads = threads
+        self.live = is_live(source)
+        self.reconnect_attempts = reconnect_attempts if self.live else 0
+        self.reconnect_delay = reconnect_delay
+        self.fps = 0.0
+        self.frame_count = 0
+        self.width = 0
+        self.height = 0
+        self.position = 0  # Index of the next frame
+        self.timestamp = 0.0  # Seconds, of the last frame read
+        self.low_latency = False  # Set through CAP_PROP_BUFFERSIZE 1 on the ffmpeg and PyAV backends
+        self.open_error = None
+        self._opened = False
+        self._try_open()
+
+    def _try_open(self):
+        try:
+            self._open()
+            self._opened = True
+        except Exception as e:
+            self.open_error = e
+            self._opened = False
+
+    # Implemented by the backends
+    def _open(self):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+    def _read(self, decode):
+        """Returns (ok, frame or None when not decoding, timestamp in seconds or None)"""
+        raise NotImplementedError
+
+    def _seek(self, frame_index):
+        raise NotImplementedError
+
+    @property
+    def decode_threads(self):
+        """Decoder threads in use, 0 if the backend doesn't tell"""
+        return self.threads
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        return self._next(decode=True)
+
+    def grab(self):
+        """Advance one frame without converting it to an image"""
+        return self._next(decode=False)[0]
+
+    def _next(self, decode):
+        if not self._opened:
+            return False, None
+        ok, frame, timestamp = self._read(decode)
+        attempts = 0
+        while not ok and attempts < self.reconnect_attempts:
+            attempts += 1
+            print(f"Frame source lost, reconnecting ({attempts}/{self.reconnect_attempts})...")
+            time.sleep(self.reconnect_delay)
+            if self.reconnect():
+                ok, frame, timestamp = self._read(decode)
+        if ok:
+            self.timestamp = timestamp if timestamp is not None else self.position / (self.fps or 30)
+            self.position += 1
+        return ok, frame
+
+    def reconnect(self):
+        """Close and reopen the source, returns whether it is open again"""
+        if self._opened:
+            self._close()
+        self._try_open()
+        return self._opened
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return self.timestamp * 1000
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.frame_count)
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        return 0.0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_BUFFERSIZE:
+            # No frame count to set here, a buffer of 1 means decode with input buffering off
+            low_latency = value <= 1
+            if low_latency != self.low_latency:
+                self.low_latency = low_latency
+                if self._opened and self.live:
+                    self.reconnect()  # The options only apply when the input is opened
+            return True
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            prop, value = cv2.CAP_PROP_POS_FRAMES, value / 1000 * (self.fps or 30)
+        if prop != cv2.CAP_PROP_POS_FRAMES or not self._opened:
+            return False
+        frame_index = max(0, int(value))
+        self._seek(frame_index)
+        self.position = frame_index
+        return True
+
+    def release(self):
+        if self._opened:
+            self._close()
+            self._opened = False
+
+
+class OpenCVSource(FrameSource):
+    name = "opencv"
+
+    def _open(self):
+        params = []
+        threads_prop = getattr(cv2, "CAP_PROP_N_THREADS", None)
+        if self.threads and threads_prop is not None:
+            params = [threads_prop, self.threads]
+        self.cap = cv2.VideoCapture(self.source, cv2.CAP_ANY, params) if params else cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            raise ValueError(f"Could not open {self.source}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.width = self.size[0] if self.size else int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = self.size[1] if self.size else int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    def _close(self):
+        self.cap.release()
+
+    def _read(self, decode):
+        if not decode:
+            return self.cap.grab(), None, self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+        ret, frame = self.cap.read()
+        if ret and self.size and (frame.shape[1], frame.shape[0]) != tuple(self.size):
+            frame = cv2.resize(frame, tuple(self.size), interpolation=cv2.INTER_AREA)
+        return ret, frame, self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+
+    def _seek(self, frame_index):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+
+    @property
+    def decode_threads(self):
+        threads_prop = getattr(cv2, "CAP_PROP_N_THREADS", None)
+        return int(self.cap.get(threads_prop)) if threads_prop is not None and self._opened else self.threads
+
+    def get(self, prop):
+        # Let OpenCV answer the properties the base class doesn't track
+        if prop in (cv2.CAP_PROP_POS_FRAMES, cv2.CAP_PROP_POS_MSEC, cv2.CAP_PROP_FPS, cv2.CAP_PROP_FRAME_COUNT,
+                    cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT) or not self._opened:
+            return super().get(prop)
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        if prop in (cv2.CAP_PROP_POS_FRAMES, cv2.CAP_PROP_POS_MSEC):
+            return super().set(prop, value)
+        return self.cap.set(prop, value) if self._opened else False
+
+
+class FFmpegPipeSource(FrameSource):
+    name = "ffmpeg"
+
+    def _open(self):
+        import ffmpeg  # ffmpeg-python, only needed for this backend
+
+        probe = ffmpeg.probe(str(self.source), **rtsp_options(self.source))
+        stream = next(s for s in probe["streams"] if s["codec_type"] == "video")
+        self.fps = parse_rate(stream.get("avg_frame_rate")) or parse_rate(stream.get("r_frame_rate")) or 30.0
+        self.frame_count = int(stream.get("nb_frames", 0) or 0)
+        if not self.frame_count and not self.live:
+            self.frame_count = int(float(probe["format"].get("duration", 0)) * self.fps)
+        self.width, self.height = self.size or (int(stream["width"]), int(stream["height"]))
+        self._frame_bytes = self.width * self.height * 3
+        self._start(self.position)
+
+    def _start(self, frame_index):
+        import ffmpeg
+
+        input_args = input_options(self.source, self.low_latency)
+        if frame_index and not self.live:
+            input_args["ss"] = frame_index / self.fps
+        if self.threads:
+            input_args["threads"] = self.threads
+        output_args = {"format": "rawvideo", "pix_fmt": "bgr24"}
+        if self.size:
+            output_args["s"] = f"{self.width}x{self.height}"
+        self._start_time = 0.0 if self.live else frame_index / self.fps
+        self._frames_since_start = 0
+        self.process = (
+            ffmpeg
+            .input(str(self.source), **input_args)
+            .output('pipe:', **output_args)
+            .global_args('-loglevel', 'error', '-nostdin')
+            .run_async(pipe_stdout=True)
+        )
+
+    def _close(self):
+        self.process.stdout.close()
+        self.process.terminate()
+        self.process.wait()
+
+    def _read(self, decode):
+        # Read exactly one frame, a pipe can return fewer bytes than asked for
+        buffer = bytearray(self._frame_bytes)
+        view = memoryview(buffer)
+        received = 0
+        while received < self._frame_bytes:
+            count = self.process.stdout.readinto(view[received:])
+            if not count:
+                return False, None, None
+            received += count
+        timestamp = self._start_time + self._frames_since_start / (self.fps or 30)
+        self._frames_since_start += 1
+        if not decode:
+            return True, None, timestamp
+        return True, np.frombuffer(buffer, np.uint8).reshape(self.height, self.width, 3), timestamp
+
+    def _seek(self, frame_index):
+        self._close()
+        self._start(frame_index)
+
+
+class PyAVSource(FrameSource):
+    name = "pyav"
+
+    def _open(self):
+        import av  # PyAV, only needed for this backend
+
+        self.container = av.open(str(self.source), options=input_options(self.source, self.low_latency))
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = "AUTO"  # Frame and slice threading
+        if self.threads:
+            self.stream.codec_context.thread_count = self.threads
+        rate = self.stream.average_rate or self.stream.guessed_rate
+        self.fps = float(rate) if rate else 30.0
+        self.frame_count = self.stream.frames
+        if not self.frame_count and self.stream.duration and not self.live:
+            self.frame_count = int(float(self.stream.duration * self.stream.time_base) * self.fps)
+        self.width, self.height = self.size or (self.stream.codec_context.width, self.stream.codec_context.height)
+        # Timestamps count from the stream's first frame, MPEG-TS and many NVR exports don't start at 0
+        start_time = self.stream.start_time
+        self._start_offset = float(start_time * self.stream.time_base) if start_time is not None else 0.0
+        self._frames = self.container.decode(self.stream)
+        self._pending = None  # Frame decoded while seeking, returned by the next read
+
+    def _close(self):
+        self.container.close()
+
+    def _frame_time(self, frame):
+        return frame.time - self._start_offset if frame.time is not None else None
+
+    def _read(self, decode):
+        frame = self._pending
+        self._pending = None
+        if frame is None:
+            try:
+                frame = next(self._frames)
+            except StopIteration:
+                return False, None, None
+            except Exception as e:
+                # Corrupt data ends the stream, as it does for OpenCV
+                print(f"Decode error: {str(e)}")
+                return False, None, None
+        if not decode:
+            return True, None, self._frame_time(frame)
+        timestamp = self._frame_time(frame)
+        if self.size:
+            frame = frame.reformat(width=self.width, height=self.height)
+        return True, frame.to_ndarray(format="bgr24"), timestamp
+
+    def _seek(self, frame_index):
+        target = frame_index / self.fps
+        # Jump to the keyframe before the target, then decode up to the exact frame
+        self.container.seek(int((target + self._start_offset) / self.stream.time_base), stream=self.stream,
+                            backward=True)
+        self._frames = self.container.decode(self.stream)
+        self._pending = None
+        for frame in self._frames:
+            if frame.time is None or self._frame_time(frame) >= target - 0.5 / self.fps:
+                self._pending = frame
+                break
+
+    @property
+    def decode_threads(self):
+        return self.stream.codec_context.thread_count if self._opened else self.threads
+
+
+BACKENDS = {"opencv": OpenCVSource, "ffmpeg": FFmpegPipeSource, "pyav": PyAVSource}
+
+
+def available_backends():
+    """Backends whose dependencies are installed"""
+    available = ["opencv"]
+    if importlib.util.find_spec("ffmpeg") is not None and shutil.which("ffmpeg"):
+        available.append("ffmpeg")
+    if importlib.util.find_spec("av") is not None:
+        available.append("pyav")
+    return available
+
+
+def benchmark_backends(source, frames=60, size=None):
+    """Decode speed of each available backend on the source, {backend: frames per second}"""
+    results = {}
+    for name in available_backends():
+        frame_source = BACKENDS[name](source, size=size, reconnect_attempts=0)
+        try:
+            if not frame_source.isOpened():
+                continue
+            frame_source.read()  # Keep opening and the first frame out of the measurement
+            start = time.perf_counter()
+            count = 0
+            while count < frames and frame_source.read()[0]:
+                count += 1
+            if count:
+                results[name] = count / max(time.perf_counter() - start, 1e-9)
+        finally:
+            frame_source.release()
+    return results
+
+
+def best_backend(source, size=None):
+    """The fastest backend for a file, benchmarked once per session; opencv for live sources.
+
+    A live source delivers frames at the camera's rate, so a benchmark would only
+    measure the camera, block for seconds and throw the frames away.
+    """
+    if is_live(source):
+        return "opencv"
+    key = (str(source), size)
+    if key not in _best_backends:
+        results = benchmark_backends(source, size=size)
+        _best_backends[key] = max(results, key=results.get) if results else "opencv"
+    return _best_backends[key]
+
+
+def open_source(source, backend="auto", **kwargs):
+    """Open a frame source, backend "auto" picks the fastest one for this source"""
+    if backend == "auto":
+        backend = best_backend(source, kwargs.get("size"))
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown frame source backend: {backend}")
+    return BACKENDS[backend](source, **kwargs)
+
+
+def main(argv=None):
+    """Print the decode speed of every backend for a file or stream"""
+    parser = argparse.ArgumentParser(description="Benchmark the frame source backends on a video or stream")
+    parser.add_argument("source", help="Video file or stream URL")
+    parser.add_argument("--frames", type=int, default=300, help="Frames to decode per backend (default: 300)")
+    parser.add_argument("--size", type=int, nargs=2, default=None, metavar=("WIDTH", "HEIGHT"))
+    args = parser.parse_args(argv)
+
+    size = tuple(args.size) if args.size else None
+    results = benchmark_backends(args.source, args.frames, size)
+    for name in BACKEND_NAMES:
+        if name in results:
+            print(f"{name:<7} {results[name]:8.1f} FPS")
+        else:
+            print(f"{name:<7} unavailable")
+    if results:
+        print(f"Fastest: {max(results, key=results.get)}")
+
+
+if __name__ == "__main__":
+    main()
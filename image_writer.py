@@ -0,0 +1,90 @@
+"""Image writer that encodes and saves frames on a pool of background threads.
+
+Frames go through a bounded queue to N encoder threads, so decoding continues
+while earlier frames are encoded and written. When the disk or the encoders fall
+a whole queue behind, write() blocks until there is room again, which keeps
+memory bounded. cv2.imwrite releases the GIL, so the threads encode in parallel.
+Formats:
+
+    jpg  - quality 0-100 (default 95)
+    png  - compression level 0-9 (default 3, higher is smaller and slower)
+    webp - quality 1-100 (default 90)
+"""
+import os
+import queue
+import threading
+
+import cv2
+
+IMAGE_FORMATS = ["jpg", "png", "webp"]
+
+
+def encode_params(image_format, quality=None, png_compression=3):
+    """cv2.imwrite parameters for the format"""
+    if image_format == "jpg":
+        return [cv2.IMWRITE_JPEG_QUALITY, 95 if quality is None else quality]
+    if image_format == "png":
+        return [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+    if image_format == "webp":
+        return [cv2.IMWRITE_WEBP_QUALITY, 90 if quality is None else quality]
+    raise ValueError(f"Unknown image format: {image_format}")
+
+
+class AsyncImageWriter:
+    """cv2.imwrite replacement that encodes and writes off the calling thread"""
+
+    def __init__(self, image_format="jpg", quality=None, png_compression=3, threads=None, queue_size=64):
+        self.image_format = image_format
+        self.params = encode_params(image_format, quality, png_compression)
+        self.images_written = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._error = None
+        self._threads = [
+            threading.Thread(target=self._run, name=f"image-writer-{i}", daemon=True)
+            for i in range(threads or min(4, os.cpu_count() or 1))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def extension(self):
+        return f".{self.image_format}"
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            if self._error is not None:
+                continue  # Keep draining so write() never blocks on failed encoders
+            path, frame = job
+            try:
+                if not cv2.imwrite(path, frame, self.params):
+                    raise OSError(f"Could not write {path}")
+                with self._lock:
+                    self.images_written += 1
+            except Exception as e:
+                self._error = e
+
+    def write(self, path, frame):
+        """Queue a frame to be saved at path, the frame must not be changed afterwards"""
+        if self._error is not None:
+            raise RuntimeError(f"Image writing failed: {self._error}")
+        self._queue.put((path, frame))
+
+    def release(self):
+        """Write the queued frames and stop the threads"""
+        for thread in self._threads:
+            if thread.is_alive():
+                self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self._error is not None:
+            raise RuntimeError(f"Image writing failed: {self._error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
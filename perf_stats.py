@@ -0,0 +1,109 @@
+"""Per-stage timing for the processing pipeline.
+
+Keeps a rolling window of durations per stage for percentiles, counts processed
+frames for FPS, and records every timed span so a run can be exported as CSV or
+as a Chrome trace (open in chrome://tracing or https://ui.perfetto.dev).
+"""
+import csv
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class PerfRecorder:
+    """Thread-safe per-stage timer, shared by all pipeline stages"""
+
+    def __init__(self, window=300, max_trace_events=200000):
+        self.window = window
+        self.max_trace_events = max_trace_events
+        self._lock = threading.Lock()
+        self._durations = {}  # stage -> deque of recent durations (seconds)
+        self._events = deque(maxlen=max_trace_events)  # (stage, start, duration, track)
+        self._frame_times = deque(maxlen=window)
+        self.counters = {}
+        self.origin = time.perf_counter()
+
+    def record(self, stage, start, duration, track=None):
+        """Record a span that started at start (perf_counter seconds) and lasted duration seconds.
+
+        track names the row the span is shown on in the trace, the current thread by default.
+        """
+        track = track or threading.current_thread().name
+        with self._lock:
+            if stage not in self._durations:
+                self._durations[stage] = deque(maxlen=self.window)
+            self._durations[stage].append(duration)
+            self._events.append((stage, start, duration, track))
+
+    def frame_done(self):
+        """Mark one frame as fully processed, used for the FPS figure"""
+        with self._lock:
+            self._frame_times.append(time.perf_counter())
+
+    def set_counter(self, name, value):
+        with self._lock:
+            self.counters[name] = value
+
+    def fps(self):
+        with self._lock:
+            if len(self._frame_times) < 2:
+                return 0.0
+            span = self._frame_times[-1] - self._frame_times[0]
+            return (len(self._frame_times) - 1) / span if span > 0 else 0.0
+
+    def summary(self):
+        """Rolling p50/p95/p99 in milliseconds for every stage"""
+        with self._lock:
+            windows = {stage: np.array(values) * 1000 for stage, values in self._durations.items() if values}
+        summary = {}
+        for stage, values in windows.items():
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            summary[stage] = {"p50": p50, "p95": p95, "p99": p99, "count": len(values)}
+        return summary
+
+    def format_lines(self):
+        """Short text lines for the stats panel and the video overlay"""
+        lines = [f"FPS: {self.fps():.1f}"]
+        for stage, stats in self.summary().items():
+            lines.append(f"{stage}: {stats['p50']:.1f} / {stats['p95']:.1f} / {stats['p99']:.1f} ms")
+        with self._lock:
+            counters = dict(self.counters)
+        for name, value in counters.items():
+            lines.append(f"{name}: {value}")
+        return lines
+
+    def export_csv(self, path):
+        """Write every recorded span as a CSV row"""
+        with self._lock:
+            events = list(self._events)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["stage", "track", "start_ms", "duration_ms"])
+            for stage, start, duration, track in events:
+                writer.writerow([stage, track, f"{(start - self.origin) * 1000:.3f}", f"{duration * 1000:.3f}"])
+
+    def export_chrome_trace(self, path):
+        """Write every recorded span in the Chrome trace event format"""
+        with self._lock:
+            events = list(self._events)
+        track_ids = {}
+        trace_events = []
+        for stage, start, duration, track in events:
+            tid = track_ids.setdefault(track, len(track_ids) + 1)
+            trace_events.append({
+                "name": stage,
+                "ph": "X",
+                "ts": (start - self.origin) * 1e6,
+                "dur": duration * 1e6,
+                "pid": os.getpid(),
+                "tid": tid
+            })
+        for track, tid in track_ids.items():
+            trace_events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+                                 "args": {"name": track}})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,103 @@
+"""Video writer that encodes on a background thread.
+
+Frames go through a bounded queue to an encoder thread, so the caller only waits
+when the encoder falls a whole queue behind. Two backends:
+
+    opencv - cv2.VideoWriter with a FourCC codec (default mp4v)
+    ffmpeg - raw frames piped into an ffmpeg process, any ffmpeg codec and preset
+             (default libx264, preset veryfast)
+"""
+import queue
+import threading
+
+import cv2
+
+WRITER_BACKENDS = ["opencv", "ffmpeg"]
+DEFAULT_CODECS = {"opencv": "mp4v", "ffmpeg": "libx264"}
+
+
+class AsyncVideoWriter:
+    """Drop-in for cv2.VideoWriter.write/release that encodes off the calling thread"""
+
+    def __init__(self, path, fps, size, backend="opencv", codec=None, preset="veryfast", queue_size=64):
+        if backend not in WRITER_BACKENDS:
+            raise ValueError(f"Unknown writer backend: {backend}")
+        self.path = path
+        self.fps = fps
+        self.size = size  # (width, height)
+        self.backend = backend
+        self.codec = codec or DEFAULT_CODECS[backend]
+        self.preset = preset
+        self.frames_written = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._encoder = self._open()
+        self._thread = threading.Thread(target=self._run, name="video-writer", daemon=True)
+        self._thread.start()
+
+    def _open(self):
+        if self.backend == "opencv":
+            writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.codec), self.fps, self.size)
+            if not writer.isOpened():
+                raise ValueError(f"Could not open {self.path} for writing with codec {self.codec}")
+            return writer
+
+        import ffmpeg  # Only needed for this backend
+
+        width, height = self.size
+        output_args = {"vcodec": self.codec, "pix_fmt": "yuv420p"}
+        if self.preset:
+            output_args["preset"] = self.preset
+        return (
+            ffmpeg
+            .input('pipe:', format='rawvideo', pix_fmt='bgr24', s=f'{width}x{height}', r=self.fps)
+            .output(self.path, **output_args)
+            .overwrite_output()
+            # Nothing reads ffmpeg's output, so it must not be piped: a full stderr pipe would stall the encoder
+            .global_args('-loglevel', 'error', '-nostats')
+            .run_async(pipe_stdin=True)
+        )
+
+    def _encode(self, frame):
+        if self.backend == "opencv":
+            self._encoder.write(frame)
+        else:
+            self._encoder.stdin.write(frame.tobytes())
+
+    def _run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            if self._error is not None:
+                continue  # Keep draining so write() never blocks on a dead encoder
+            try:
+                self._encode(frame)
+                self.frames_written += 1
+            except Exception as e:
+                self._error = e
+
+    def write(self, frame):
+        """Queue a frame for encoding, the frame must not be changed afterwards"""
+        if self._error is not None:
+            raise RuntimeError(f"Video encoding failed: {self._error}")
+        self._queue.put(frame)
+
+    def release(self):
+        """Encode the queued frames and close the file"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self.backend == "opencv":
+            self._encoder.release()
+        else:
+            self._encoder.stdin.close()
+            self._encoder.wait()
+        if self._error is not None:
+            raise RuntimeError(f"Video encoding failed: {self._error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()